@@ -0,0 +1,292 @@
+import argparse
+import csv
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+# Synthetic events and import/summary/timeline timings. `run` starts one worker
+# process per --database-url (each needs its own engine) and writes every
+# worker's results to one JSON file so runs can be compared across commits.
+# Events are created with unique names and deleted afterwards; point it at a
+# scratch database anyway.
+
+EVENT_START = datetime(2024, 7, 1, 10, 0, 0)
+HEADER = ["selling_point", "ept", "amount_cents", "currency", "occurred_at", "card_last4"]
+
+
+def selling_point_names(count: int) -> list[str]:
+    return [f"SP-{i:03d}" for i in range(1, count + 1)]
+
+
+def ept_labels(selling_point: str, count: int) -> list[str]:
+    return [f"{selling_point}-T{i}" for i in range(1, count + 1)]
+
+
+def generate_csv(
+    path: str,
+    selling_points: int,
+    epts: int,
+    transactions: int,
+    hours: float,
+    duplicate_ratio: float = 0.0,
+    seed: int = 0,
+) -> None:
+    # Worldline-format rows spread uniformly over the event; `duplicate_ratio` of
+    # them repeat an earlier row verbatim, as cumulative provider exports do.
+    rng = random.Random(seed)
+    terminals = [
+        (sp, label) for sp in selling_point_names(selling_points) for label in ept_labels(sp, epts)
+    ]
+    span = int(hours * 3600)
+    written: list[list[str]] = []
+    with open(path, "w", newline="") as out:
+        writer = csv.writer(out)
+        writer.writerow(HEADER)
+        for _ in range(transactions):
+            if written and rng.random() < duplicate_ratio:
+                row = rng.choice(written)
+            else:
+                sp, label = rng.choice(terminals)
+                occurred_at = EVENT_START + timedelta(seconds=rng.randrange(span))
+                row = [
+                    sp,
+                    label,
+                    str(rng.randrange(100, 5000)),
+                    "CHF",
+                    occurred_at.isoformat(),
+                    f"{rng.randrange(10000):04d}",
+                ]
+                if len(written) < 100_000:
+                    written.append(row)
+            writer.writerow(row)
+
+
+def _timings(samples: list[float]) -> dict[str, float]:
+    return {
+        "median_ms": statistics.median(samples) * 1000,
+        "min_ms": min(samples) * 1000,
+        "max_ms": max(samples) * 1000,
+    }
+
+
+def _timed(call, repeat: int, before=None) -> list[float]:
+    samples = []
+    for _ in range(repeat):
+        if before:
+            before()
+        started = time.perf_counter()
+        response = call()
+        samples.append(time.perf_counter() - started)
+        response.raise_for_status()
+    return samples
+
+
+def run_worker(args: argparse.Namespace) -> dict:
+    # Imported here: the engine is created from DATABASE_URL at import time.
+    from fastapi.testclient import TestClient
+
+    from cache import summary_cache
+    from db import engine
+    from main import app
+
+    result: dict = {"database": engine.dialect.name}
+    with TestClient(app) as client, tempfile.TemporaryDirectory() as directory:
+        event = client.post(
+            "/events/",
+            json={
+                "name": f"bench-{uuid.uuid4()}",
+                "start_at": EVENT_START.isoformat(),
+                "end_at": (EVENT_START + timedelta(hours=args.hours)).isoformat(),
+            },
+        ).json()
+        event_id = event["id"]
+        try:
+            for i, sp in enumerate(selling_point_names(args.selling_points)):
+                sp_id = client.post(
+                    f"/events/{event_id}/selling-points",
+                    json={"name": sp, "latitude": 46.5 + i / 1000, "longitude": 6.6},
+                ).json()["id"]
+                for label in ept_labels(sp, args.epts):
+                    client.post(
+                        f"/events/selling-points/{sp_id}/epts",
+                        json={"provider": "worldline", "label": label},
+                    )
+
+            path = os.path.join(directory, "bench.csv")
+            generate_csv(
+                path,
+                args.selling_points,
+                args.epts,
+                args.transactions,
+                args.hours,
+                args.duplicate_ratio,
+                args.seed,
+            )
+            with open(path, "rb") as f:
+                started = time.perf_counter()
+                response = client.post(
+                    f"/events/{event_id}/imports",
+                    data={"parser": "mock_worldline"},
+                    files={"file": ("bench.csv", f, "text/csv")},
+                )
+                elapsed = time.perf_counter() - started
+            response.raise_for_status()
+            summary = response.json()
+            result["import"] = {
+                **summary,
+                "seconds": elapsed,
+                "rows_per_second": summary["processed"] / elapsed if elapsed else 0.0,
+            }
+
+            summary_url = f"/events/{event_id}/summary"
+            result["summary"] = _timings(
+                _timed(
+                    lambda: client.get(summary_url),
+                    args.repeat,
+                    lambda: summary_cache.invalidate_local(event_id),
+                )
+            )
+            result["summary_cached"] = _timings(_timed(lambda: client.get(summary_url), args.repeat))
+
+            result["timeline"] = {}
+            for bucket in args.buckets:
+                params = {"bucket": bucket, "max_points": args.max_points}
+                result["timeline"][bucket] = _timings(
+                    _timed(
+                        lambda: client.get(f"/events/{event_id}/timeline", params=params),
+                        args.repeat,
+                    )
+                )
+        finally:
+            client.delete(f"/events/{event_id}")
+    return result
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args: argparse.Namespace) -> None:
+    params = {
+        "selling_points": args.selling_points,
+        "epts": args.epts,
+        "transactions": args.transactions,
+        "hours": args.hours,
+        "duplicate_ratio": args.duplicate_ratio,
+        "seed": args.seed,
+        "buckets": args.buckets,
+        "max_points": args.max_points,
+        "repeat": args.repeat,
+    }
+    runs = []
+    for url in args.database_url:
+        worker = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "worker", *_worker_argv(args)],
+            env={**os.environ, "DATABASE_URL": url},
+            capture_output=True,
+            text=True,
+        )
+        if worker.returncode != 0:
+            print(worker.stderr, file=sys.stderr)
+            raise SystemExit(f"Benchmark against {url} failed")
+        result = json.loads(worker.stdout.strip().splitlines()[-1])
+        runs.append(result)
+        print(
+            f"{result['database']}: import {result['import']['rows_per_second']:.0f} rows/s, "
+            f"summary {result['summary']['median_ms']:.1f} ms, "
+            + ", ".join(
+                f"timeline {bucket} {t['median_ms']:.1f} ms"
+                for bucket, t in result["timeline"].items()
+            )
+        )
+
+    report = {
+        "commit": _git_commit(),
+        "created_at": datetime.utcnow().isoformat(),
+        "params": params,
+        "runs": runs,
+    }
+    with open(args.output, "w") as out:
+        json.dump(report, out, indent=2)
+    print(f"Wrote {args.output}")
+
+
+def _worker_argv(args: argparse.Namespace) -> list[str]:
+    return [
+        "--selling-points", str(args.selling_points),
+        "--epts", str(args.epts),
+        "--transactions", str(args.transactions),
+        "--hours", str(args.hours),
+        "--duplicate-ratio", str(args.duplicate_ratio),
+        "--seed", str(args.seed),
+        "--buckets", *args.buckets,
+        "--max-points", str(args.max_points),
+        "--repeat", str(args.repeat),
+    ]
+
+
+def _add_data_options(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--selling-points", type=int, default=20)
+    parser.add_argument("--epts", type=int, default=3, help="EPTs per selling point")
+    parser.add_argument("--transactions", type=int, default=100_000)
+    parser.add_argument("--hours", type=float, default=12, help="event duration")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def _add_timing_options(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--buckets", nargs="+", default=["1m", "5m", "1h"])
+    parser.add_argument("--max-points", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+
+
+if __name__ == "__main__":
+    cli = argparse.ArgumentParser(description="Import, summary and timeline benchmarks")
+    commands = cli.add_subparsers(dest="command", required=True)
+
+    generate = commands.add_parser("generate", help="write a synthetic Worldline CSV")
+    generate.add_argument("path")
+    _add_data_options(generate)
+
+    bench = commands.add_parser("run", help="run the benchmarks and write a JSON report")
+    bench.add_argument(
+        "--database-url",
+        action="append",
+        help="database to benchmark; repeat for several (default: sqlite:///./bench.db)",
+    )
+    bench.add_argument("--output", default="bench_results.json")
+    _add_data_options(bench)
+    _add_timing_options(bench)
+
+    worker = commands.add_parser("worker")
+    _add_data_options(worker)
+    _add_timing_options(worker)
+
+    args = cli.parse_args()
+    if args.command == "generate":
+        generate_csv(
+            args.path,
+            args.selling_points,
+            args.epts,
+            args.transactions,
+            args.hours,
+            args.duplicate_ratio,
+            args.seed,
+        )
+    elif args.command == "run":
+        args.database_url = args.database_url or ["sqlite:///./bench.db"]
+        run(args)
+    else:
+        print(json.dumps(run_worker(args)))
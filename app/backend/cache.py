@@ -0,0 +1,146 @@
+import threading
+from collections import OrderedDict
+from typing import Protocol
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+import versions
+from db import settings
+from stream import publisher
+
+CACHE_CHANNEL = "__summary_cache__"
+
+
+class SharedBackend(Protocol):
+    def get(self, key: str) -> bytes | None:
+        ...
+
+    def set(self, key: str, value: bytes) -> None:
+        ...
+
+    def delete(self, key: str) -> None:
+        ...
+
+
+class RedisBackend:
+    def __init__(self, url: str, ttl_seconds: int):
+        try:
+            import redis
+        except ImportError as exc:
+            raise RuntimeError("cache_url requires the 'redis' package") from exc
+        self.client = redis.Redis.from_url(url)
+        self.ttl_seconds = ttl_seconds
+
+    def get(self, key: str) -> bytes | None:
+        return self.client.get(key)
+
+    def set(self, key: str, value: bytes) -> None:
+        self.client.set(key, value, ex=self.ttl_seconds)
+
+    def delete(self, key: str) -> None:
+        self.client.delete(key)
+
+
+class SummaryCache:
+    # Encoded event summaries keyed by event id, stored with the data version
+    # they were computed at. Commits in this process drop entries right away;
+    # callers pass the event's current data_version to `get`, so entries left
+    # behind by writes from other workers or CLI runs miss instead of being
+    # served.
+    def __init__(self, maxsize: int, shared: SharedBackend | None = None):
+        self.maxsize = maxsize
+        self.shared = shared
+        self._entries: OrderedDict[str, tuple[int, bytes]] = OrderedDict()
+        self._generations: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, event_id: str, version: int) -> tuple[int, bytes] | None:
+        with self._lock:
+            entry = self._entries.get(event_id)
+            if entry and entry[0] == version:
+                self._entries.move_to_end(event_id)
+                self.hits += 1
+                return entry
+            if entry:
+                del self._entries[event_id]
+        if self.shared:
+            raw = self.shared.get(f"summary:{event_id}")
+            if raw:
+                stored, _, body = raw.partition(b":")
+                if int(stored) == version:
+                    entry = (version, body)
+                    self._store(event_id, entry)
+                    with self._lock:
+                        self.hits += 1
+                    return entry
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def generation(self, event_id: str) -> int:
+        with self._lock:
+            return self._generations.get(event_id, 0)
+
+    def set(
+        self, event_id: str, version: int, summary: bytes, generation: int
+    ) -> None:
+        # `generation` is read before the summary was computed; if the event was
+        # invalidated in the meantime the result may predate that commit.
+        if self.generation(event_id) != generation:
+            return
+        self._store(event_id, (version, summary))
+        if self.shared:
+            self.shared.set(
+                f"summary:{event_id}", f"{version}:".encode() + summary
+            )
+
+    def _store(self, event_id: str, entry: tuple[int, bytes]) -> None:
+        with self._lock:
+            self._entries[event_id] = entry
+            self._entries.move_to_end(event_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_local(self, event_id: str) -> None:
+        with self._lock:
+            self._entries.pop(event_id, None)
+            self._generations[event_id] = self._generations.get(event_id, 0) + 1
+
+    def invalidate(self, event_id: str) -> None:
+        self.invalidate_local(event_id)
+        if self.shared:
+            self.shared.delete(f"summary:{event_id}")
+        publisher.publish(CACHE_CHANNEL, {"type": "invalidate", "event_id": event_id})
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+            }
+
+
+summary_cache = SummaryCache(
+    settings.summary_cache_size,
+    RedisBackend(settings.cache_url, settings.cache_ttl_seconds) if settings.cache_url else None,
+)
+publisher.add_listener(
+    CACHE_CHANNEL, lambda message: summary_cache.invalidate_local(message["event_id"])
+)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session: Session) -> None:
+    for event_id in session.info.pop(versions.CHANGED_EVENTS, ()):
+        summary_cache.invalidate(event_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back(session: Session) -> None:
+    session.info.pop(versions.CHANGED_EVENTS, None)
@@ -1,19 +1,135 @@
-from typing import Generator
+from typing import AsyncGenerator, Callable, Generator, Literal, TypeVar
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import URL, Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker, DeclarativeBase
 from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
     database_url: str = "sqlite:///./app.db"
+    # Optional replica for summary and timeline reads. Replication lag shows up
+    # as briefly stale timelines; summaries are only cached once the replica has
+    # caught up with the primary's data version.
+    read_database_url: str | None = None
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    # Seconds a request waits for a pooled connection before failing.
+    db_pool_timeout: float = 10
+    # Seconds after which connections are replaced, ahead of server-side idle
+    # timeouts.
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+    # Postgres only; None disables it (e.g. for long rollups rebuilds).
+    db_statement_timeout_ms: int | None = 30_000
+    # Serves list, summary and timeline endpoints through asyncpg/aiosqlite
+    # instead of blocking Sessions in the threadpool.
+    db_async: bool = False
+    import_dir: str = "./imports"
+    import_workers: int = 2
+    # Processes parsing bulk uploads; None uses one per CPU.
+    import_processes: int | None = None
+    # "copy" stages rows with COPY FROM STDIN on Postgres; SQLite always inserts.
+    import_mode: Literal["insert", "copy"] = "copy"
+    stream_backend: str = "local"
+    summary_cache_size: int = 256
+    cache_url: str | None = None
+    cache_ttl_seconds: int = 24 * 3600
+    # Enables ?profile=1 on API requests.
+    debug: bool = False
+    # Traces allocations to report peak memory in Server-Timing (slow).
+    metrics_trace_memory: bool = False
 
 
 settings = Settings()
 
-engine = create_engine(settings.database_url)
+T = TypeVar("T")
+
+ASYNC_DRIVERS = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
+
+# Development profile for file-backed SQLite: WAL lets readers proceed during
+# an import, and waits on the write lock instead of failing with "database is
+# locked".
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "cache_size": -64_000,
+    "temp_store": "MEMORY",
+}
+
+
+def _sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def _engine_options(url: URL) -> dict:
+    if url.get_backend_name() == "sqlite":
+        if url.database in (None, "", ":memory:"):
+            # One shared connection; pool sizing does not apply.
+            return {}
+        options = {}
+    else:
+        options = {"pool_pre_ping": settings.db_pool_pre_ping}
+    if settings.db_statement_timeout_ms is not None and url.get_backend_name() == "postgresql":
+        if url.get_driver_name() == "asyncpg":
+            options["connect_args"] = {
+                "server_settings": {"statement_timeout": str(settings.db_statement_timeout_ms)}
+            }
+        else:
+            options["connect_args"] = {
+                "options": f"-c statement_timeout={settings.db_statement_timeout_ms}"
+            }
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        **options,
+    }
+
+
+def make_engine(url: str) -> Engine:
+    parsed = make_url(url)
+    new_engine = create_engine(parsed, **_engine_options(parsed))
+    if parsed.get_backend_name() == "sqlite":
+        event.listen(new_engine, "connect", _sqlite_pragmas)
+    return new_engine
+
+
+def make_async_engine(url: str, **options) -> AsyncEngine:
+    # Same database and pool settings as make_engine, through the asyncio
+    # driver of the backend.
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    parsed = parsed.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+    if "poolclass" not in options:
+        options = {**_engine_options(parsed), **options}
+    new_engine = create_async_engine(parsed, **options)
+    if backend == "sqlite":
+        event.listen(new_engine.sync_engine, "connect", _sqlite_pragmas)
+    return new_engine
+
+
+engine = make_engine(settings.database_url)
+read_engine = make_engine(settings.read_database_url) if settings.read_database_url else engine
 
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+ReadSessionLocal = sessionmaker(bind=read_engine, autoflush=False, autocommit=False)
+
+AsyncSessionLocal = AsyncReadSessionLocal = None
+if settings.db_async:
+    async_engine = make_async_engine(settings.database_url)
+    async_read_engine = (
+        make_async_engine(settings.read_database_url) if settings.read_database_url else async_engine
+    )
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False)
+    AsyncReadSessionLocal = async_sessionmaker(async_read_engine, autoflush=False)
 
 
 class Base(DeclarativeBase):
@@ -26,3 +142,37 @@ def get_db() -> Generator:
         yield db
     finally:
         db.close()
+
+
+class QueryRunner:
+    # Runs sync query helpers, called as fn(session, *args), from async
+    # endpoints: on an AsyncSession they execute through SQLAlchemy's greenlet
+    # bridge on the event loop, on a blocking Session in the threadpool.
+    def __init__(self, session: Session | AsyncSession):
+        self.session = session
+
+    async def run(self, fn: Callable[..., T], *args) -> T:
+        if isinstance(self.session, AsyncSession):
+            return await self.session.run_sync(fn, *args)
+        return await run_in_threadpool(fn, self.session, *args)
+
+
+def query_runner(
+    sync_factory: sessionmaker, async_factory: async_sessionmaker | None
+) -> Callable[[], AsyncGenerator[QueryRunner, None]]:
+    async def dependency() -> AsyncGenerator[QueryRunner, None]:
+        if async_factory is not None:
+            async with async_factory() as session:
+                yield QueryRunner(session)
+            return
+        session = sync_factory()
+        try:
+            yield QueryRunner(session)
+        finally:
+            await run_in_threadpool(session.close)
+
+    return dependency
+
+
+get_query_runner = query_runner(SessionLocal, AsyncSessionLocal)
+get_read_query_runner = query_runner(ReadSessionLocal, AsyncReadSessionLocal)
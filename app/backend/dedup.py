@@ -0,0 +1,27 @@
+from typing import Iterable
+
+
+class KnownKeys:
+    # Pre-check for one import: the row keys of the chunks this import has
+    # already handled, so a row repeated within the import is counted as
+    # skipped before it is resolved or sent to the database, without a query.
+    # Nothing is loaded up front, which keeps a small upload cheap however many
+    # rows the event already holds: the import ledger keeps files imported
+    # before from being read again, and ON CONFLICT settles the stored rows
+    # that remain.
+    def __init__(self):
+        self.keys: set[bytes] = set()
+
+    def duplicates(self, keys: list[bytes]) -> list[bool]:
+        # Flags the keys already known or repeating an earlier key of the list.
+        flags: list[bool] = []
+        local: set[bytes] = set()
+        for key in keys:
+            flags.append(key in self.keys or key in local)
+            local.add(key)
+        return flags
+
+    def add(self, keys: Iterable[bytes]) -> None:
+        # Called once a chunk is committed or skipped; rows whose insert was
+        # rolled back are left out.
+        self.keys.update(keys)
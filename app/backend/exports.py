@@ -0,0 +1,199 @@
+import csv
+import io
+import zlib
+from datetime import datetime
+from typing import Iterable, Iterator, Sequence
+
+from sqlalchemy import select
+
+import models, rollups
+from db import ReadSessionLocal
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional: only the Parquet format needs it
+    pa = None
+
+# Rows fetched per round trip from the server-side cursor; also the CSV chunk.
+EXPORT_BATCH_ROWS = 10_000
+PARQUET_ROW_GROUP_ROWS = 100_000
+
+TRANSACTION_COLUMNS = (
+    ("id", "string"),
+    ("occurred_at", "timestamp"),
+    ("selling_point", "string"),
+    ("ept", "string"),
+    ("amount_cents", "int64"),
+    ("currency", "string"),
+    ("card_last4", "string"),
+    ("source", "string"),
+)
+SUMMARY_COLUMNS = (
+    ("selling_point", "string"),
+    ("ept", "string"),
+    ("total_cents", "int64"),
+    ("tx_count", "int64"),
+    ("avg_ticket_cents", "float64"),
+    ("first_at", "timestamp"),
+    ("last_at", "timestamp"),
+)
+
+
+def transaction_batches(event_id: str, conditions: Sequence = ()) -> Iterator[list[tuple]]:
+    # Streams with its own session: the response body is produced after the
+    # endpoint has returned. yield_per keeps one batch in memory at a time (a
+    # named server-side cursor on Postgres).
+    tx = models.Transaction
+    stmt = (
+        select(
+            tx.id,
+            tx.occurred_at,
+            models.SellingPoint.name,
+            models.EPT.label,
+            tx.amount_cents,
+            tx.currency,
+            tx.card_last4,
+            tx.source,
+        )
+        .join(models.SellingPoint, models.SellingPoint.id == tx.selling_point_id)
+        .join(models.EPT, models.EPT.id == tx.ept_id)
+        .where(tx.event_id == event_id, *conditions)
+        .order_by(tx.occurred_at, tx.id)
+        .execution_options(yield_per=EXPORT_BATCH_ROWS)
+    )
+    db = ReadSessionLocal()
+    try:
+        for partition in db.execute(stmt).partitions():
+            yield [tuple(row) for row in partition]
+    finally:
+        db.close()
+
+
+def summary_batches(event_id: str) -> Iterator[list[tuple]]:
+    # One row per EPT, from the rollups like the summary endpoint.
+    db = ReadSessionLocal()
+    try:
+        _, ept_totals = rollups.totals(db, event_id)
+        epts = db.execute(
+            select(models.SellingPoint.name, models.EPT.id, models.EPT.label)
+            .join(models.EPT, models.EPT.selling_point_id == models.SellingPoint.id)
+            .where(models.SellingPoint.event_id == event_id)
+            .order_by(models.SellingPoint.name, models.EPT.label)
+        ).all()
+    finally:
+        db.close()
+    empty = rollups.Totals()
+    rows = []
+    for sp_name, ept_id, label in epts:
+        t = ept_totals.get(ept_id, empty)
+        rows.append(
+            (
+                sp_name,
+                label,
+                int(t.total_cents),
+                int(t.tx_count),
+                float(t.avg_ticket_cents),
+                t.first_at,
+                t.last_at,
+            )
+        )
+    yield rows
+
+
+def gzipped(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _csv_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def csv_chunks(columns: Sequence[tuple[str, str]], batches: Iterable[list[tuple]]) -> Iterator[bytes]:
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow([name for name, _ in columns])
+    for batch in batches:
+        writer.writerows([_csv_value(v) for v in row] for row in batch)
+        yield out.getvalue().encode()
+        out.seek(0)
+        out.truncate()
+    if out.tell():
+        yield out.getvalue().encode()
+
+
+class _Drain:
+    # Write-only file object for ParquetWriter whose contents are handed out
+    # (and dropped) after every row group.
+    closed = False
+
+    def __init__(self) -> None:
+        self.buffer = bytearray()
+        self.position = 0
+
+    def write(self, data) -> int:
+        self.buffer += data
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def _arrow_schema(columns: Sequence[tuple[str, str]]):
+    types = {
+        "string": pa.string(),
+        "int64": pa.int64(),
+        "float64": pa.float64(),
+        "timestamp": pa.timestamp("us"),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in columns])
+
+
+def parquet_chunks(
+    columns: Sequence[tuple[str, str]],
+    batches: Iterable[list[tuple]],
+    compression: str = "snappy",
+) -> Iterator[bytes]:
+    # Buffers at most one row group (plus one fetch batch) of rows.
+    schema = _arrow_schema(columns)
+    sink = _Drain()
+    writer = pq.ParquetWriter(sink, schema, compression=compression)
+
+    def write_group(rows: list[tuple]) -> bytes:
+        values = list(zip(*rows))
+        writer.write_table(
+            pa.Table.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(values, schema)],
+                schema=schema,
+            ),
+            row_group_size=len(rows),
+        )
+        return sink.take()
+
+    pending: list[tuple] = []
+    for batch in batches:
+        pending.extend(batch)
+        while len(pending) >= PARQUET_ROW_GROUP_ROWS:
+            yield write_group(pending[:PARQUET_ROW_GROUP_ROWS])
+            del pending[:PARQUET_ROW_GROUP_ROWS]
+    if pending:
+        yield write_group(pending)
+    writer.close()
+    yield sink.take()
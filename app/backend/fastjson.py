@@ -0,0 +1,22 @@
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+# OPT_UTC_Z keeps UTC datetimes as "...Z", like Pydantic's encoder.
+OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, option=OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    # For endpoints that build plain dicts/lists: returning a Response skips
+    # FastAPI's response_model validation and encoding (the model still
+    # documents the endpoint in OpenAPI), and the body is encoded once with
+    # orjson. Already encoded bodies are sent as they are.
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
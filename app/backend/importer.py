@@ -0,0 +1,481 @@
+import csv
+import functools
+import io
+import uuid
+from collections import defaultdict
+from concurrent.futures import Executor, as_completed
+from contextlib import ExitStack
+from itertools import islice
+from typing import IO, Callable, Iterable
+
+from sqlalchemy import insert, select, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+
+import ledger, models, rollups, schemas, versions
+from db import settings
+from dedup import KnownKeys
+from parsers import BaseParser, TransactionColumns, parse_path, read_spool
+from stream import publisher
+
+CHUNK_SIZE = 500
+# Rows staged per COPY batch on Postgres.
+COPY_BATCH_SIZE = 50_000
+
+STAGING_COLUMNS = (
+    "id, selling_point_name, ept_label, amount_cents, currency, occurred_at, card_last4,"
+    " source_row_hash"
+)
+# Ids are generated here rather than with gen_random_uuid(), which needs
+# Postgres 13+ (or pgcrypto).
+CREATE_STAGING = text(
+    "CREATE TEMP TABLE IF NOT EXISTS import_staging ("
+    " id text, selling_point_name text, ept_label text, amount_cents integer,"
+    " currency varchar(3), occurred_at timestamp, card_last4 varchar(4), source_row_hash bytea"
+    ") ON COMMIT DELETE ROWS"
+)
+# Resolves selling points and EPTs by name/label with one join, inserts the
+# resolved rows and returns them, plus one extra row carrying the number of
+# rows the join could not resolve.
+INSERT_STAGED = text(
+    """
+    WITH resolved AS (
+        SELECT s.*, sp.id AS sp_id, COALESCE(e.id, :fallback_ept_id) AS resolved_ept_id
+        FROM import_staging s
+        LEFT JOIN selling_points sp
+            ON sp.event_id = :event_id AND sp.name = s.selling_point_name
+        LEFT JOIN epts e
+            ON e.selling_point_id = sp.id AND e.label = NULLIF(s.ept_label, '')
+    ),
+    inserted AS (
+        INSERT INTO transactions (
+            id, event_id, selling_point_id, ept_id, amount_cents, currency, occurred_at,
+            card_last4, source, source_row_hash
+        )
+        SELECT id, :event_id, sp_id, resolved_ept_id, amount_cents,
+            currency, occurred_at, card_last4, :source, source_row_hash
+        FROM resolved
+        WHERE sp_id IS NOT NULL AND resolved_ept_id IS NOT NULL
+        ON CONFLICT (event_id, source, source_row_hash) DO NOTHING
+        RETURNING selling_point_id, ept_id, occurred_at, amount_cents
+    )
+    SELECT selling_point_id, ept_id, occurred_at, amount_cents, NULL AS unresolved FROM inserted
+    UNION ALL
+    SELECT NULL, NULL, NULL, NULL, count(*) FROM resolved
+    WHERE sp_id IS NULL OR resolved_ept_id IS NULL
+    """
+)
+
+
+class Lookups:
+    def __init__(self, db: Session, event_id: str, fallback_ept_id: str | None = None):
+        self.selling_points: dict[str, str] = {
+            name: sp_id
+            for sp_id, name in db.execute(
+                select(models.SellingPoint.id, models.SellingPoint.name).where(
+                    models.SellingPoint.event_id == event_id
+                )
+            )
+        }
+        self.epts: dict[tuple[str, str], str] = {
+            (sp_id, label): ept_id
+            for ept_id, sp_id, label in db.execute(
+                select(models.EPT.id, models.EPT.selling_point_id, models.EPT.label)
+                .join(models.SellingPoint)
+                .where(models.SellingPoint.event_id == event_id)
+            )
+        }
+        self.fallback_ept_id = None
+        if fallback_ept_id and db.get(models.EPT, fallback_ept_id):
+            self.fallback_ept_id = fallback_ept_id
+
+    def resolve(self, selling_point_name: str, ept_label: str | None) -> tuple[str, str] | None:
+        sp_id = self.selling_points.get(selling_point_name)
+        if not sp_id:
+            return None
+        ept_id = None
+        if ept_label:
+            ept_id = self.epts.get((sp_id, ept_label))
+        if not ept_id:
+            ept_id = self.fallback_ept_id
+        if not ept_id:
+            return None
+        return sp_id, ept_id
+
+
+@functools.cache
+def _insert_ignore(dialect_name: str):
+    # Executed with a list of row dicts: one cached statement per dialect,
+    # which insertmanyvalues batches, instead of a fresh multi-row VALUES
+    # statement (and compilation) per chunk.
+    table = models.Transaction.__table__
+    if dialect_name == "postgresql":
+        stmt = postgresql.insert(table).on_conflict_do_nothing(
+            index_elements=["event_id", "source", "source_row_hash"]
+        )
+    else:
+        stmt = insert(table).prefix_with("OR IGNORE")
+    # Only rows that were actually inserted come back, so they double as the
+    # inserted count and as the input for the rollup update.
+    return stmt.returning(
+        table.c.selling_point_id, table.c.ept_id, table.c.occurred_at, table.c.amount_cents
+    )
+
+
+def _row_values(chunk: list[schemas.TransactionIn] | TransactionColumns) -> Iterable[tuple]:
+    # (selling point name, EPT label, amount, currency, occurred_at, card last4,
+    # row hash) per row, whichever way the parser delivered the chunk.
+    if isinstance(chunk, TransactionColumns):
+        return chunk.rows()
+    return (
+        (
+            tx.selling_point_name,
+            tx.ept_label,
+            tx.amount_cents,
+            tx.currency,
+            tx.occurred_at,
+            tx.card_last4,
+            tx.source_row_hash,
+        )
+        for tx in chunk
+    )
+
+
+def _record_inserted(
+    db: Session, event_id: str, new_rows: list, changes: versions.ChangeRun
+) -> int | None:
+    # Folds freshly inserted rows into the rollups and bumps the event version
+    # inside the caller's transaction; all chunks of an import share one change
+    # row.
+    if not new_rows:
+        return None
+    rollups.apply(db, event_id, new_rows)
+    return changes.bump(db, min(row.occurred_at for row in new_rows))
+
+
+def _publish_deltas(event_id: str, version: int, new_rows: list) -> None:
+    sp_deltas: dict[str, int] = defaultdict(int)
+    ept_deltas: dict[str, int] = defaultdict(int)
+    for row in new_rows:
+        sp_deltas[row.selling_point_id] += row.amount_cents
+        ept_deltas[row.ept_id] += row.amount_cents
+    publisher.publish(
+        event_id,
+        {
+            "type": "totals",
+            "version": version,
+            "tx_count": len(new_rows),
+            "selling_points": sp_deltas,
+            "epts": ept_deltas,
+        },
+    )
+
+
+def preview(
+    db: Session,
+    event_id: str,
+    parser: BaseParser,
+    header: list[str],
+    file_obj: IO[bytes],
+    limit: int,
+    fallback_ept_id: str | None = None,
+) -> schemas.ImportPreview:
+    # Parses only the first `limit` rows and writes nothing.
+    lookups = Lookups(db, event_id, fallback_ept_id)
+    rows: list[schemas.TransactionIn] = []
+    error_message = None
+    try:
+        rows.extend(islice(parser.parse(file_obj), limit))
+    except Exception as exc:
+        error_message = f"Row {len(rows) + 1}: {exc!r}"
+    return schemas.ImportPreview(
+        parser=parser.name,
+        header=header,
+        rows=rows,
+        unresolved=sum(
+            1 for tx in rows if not lookups.resolve(tx.selling_point_name, tx.ept_label)
+        ),
+        error_message=error_message,
+    )
+
+
+def import_transactions(
+    db: Session,
+    event_id: str,
+    source: str,
+    chunks: Iterable[list[schemas.TransactionIn]] | Iterable[TransactionColumns],
+    fallback_ept_id: str | None = None,
+    on_progress: Callable[[schemas.ImportSummary], None] | None = None,
+    at_boundary: Callable[[], bool] | None = None,
+) -> schemas.ImportSummary:
+    # `at_boundary` tells when the chunks handed out so far end where the
+    # caller can record progress (see ledger.TrackedImport); the COPY path
+    # flushes its batch there so that on_progress sees exactly those rows.
+    if settings.import_mode == "copy" and db.get_bind().dialect.name == "postgresql":
+        return _copy_import(
+            db, event_id, source, chunks, fallback_ept_id, on_progress, at_boundary
+        )
+
+    lookups = Lookups(db, event_id, fallback_ept_id)
+    known = KnownKeys()
+    changes = versions.ChangeRun(event_id)
+    processed = inserted = skipped = errors = 0
+
+    for chunk in chunks:
+        processed += len(chunk)
+        values = list(_row_values(chunk))
+        keys = [row_hash for *_, row_hash in values]
+        duplicates = known.duplicates(keys)
+        rows: list[dict] = []
+        for (sp_name, ept_label, amount, currency, occurred_at, last4, row_hash), duplicate in zip(
+            values, duplicates
+        ):
+            if duplicate:
+                skipped += 1
+                continue
+            resolved = lookups.resolve(sp_name, ept_label)
+            if not resolved:
+                errors += 1
+                continue
+            sp_id, ept_id = resolved
+            rows.append(
+                {
+                    "id": str(uuid.uuid4()),
+                    "event_id": event_id,
+                    "selling_point_id": sp_id,
+                    "ept_id": ept_id,
+                    "amount_cents": amount,
+                    "currency": currency,
+                    "occurred_at": occurred_at,
+                    "card_last4": last4,
+                    "source": source,
+                    "source_row_hash": row_hash,
+                }
+            )
+        if rows:
+            try:
+                new_rows = db.execute(_insert_ignore(db.get_bind().dialect.name), rows).all()
+                version = _record_inserted(db, event_id, new_rows, changes)
+                db.commit()
+            except Exception:
+                db.rollback()
+                changes.reset()
+                errors += len(rows)
+                # Their rows may still import when repeated later on.
+                failed = {row["source_row_hash"] for row in rows}
+                keys = [key for key in keys if key not in failed]
+            else:
+                inserted += len(new_rows)
+                skipped += len(rows) - len(new_rows)
+                if version is not None:
+                    _publish_deltas(event_id, version, new_rows)
+        known.add(keys)
+        if on_progress:
+            on_progress(
+                schemas.ImportSummary(
+                    processed=processed, inserted=inserted, skipped_duplicates=skipped, errors=errors
+                )
+            )
+
+    return schemas.ImportSummary(
+        processed=processed, inserted=inserted, skipped_duplicates=skipped, errors=errors
+    )
+
+
+def _copy_rows(db: Session, values: list[tuple]) -> None:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for sp_name, ept_label, amount, currency, occurred_at, last4, row_hash in values:
+        # bytea takes hex input as \x<digits>.
+        key = "\\x" + row_hash.hex()
+        writer.writerow(
+            (uuid.uuid4(), sp_name, ept_label, amount, currency, occurred_at.isoformat(), last4, key)
+        )
+    buffer.seek(0)
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY import_staging ({STAGING_COLUMNS}) FROM STDIN WITH (FORMAT csv)", buffer
+        )
+    finally:
+        cursor.close()
+
+
+def _staged_counts(result: list, staged: int) -> tuple[list, int, int]:
+    # Splits the rows INSERT_STAGED returns into the inserted rows and the
+    # number of unresolved rows; the other staged rows were duplicates that ON
+    # CONFLICT skipped. Returns (inserted rows, unresolved, skipped).
+    new_rows = [row for row in result if row.unresolved is None]
+    unresolved = next(row.unresolved for row in result if row.unresolved is not None)
+    return new_rows, unresolved, staged - unresolved - len(new_rows)
+
+
+def _copy_import(
+    db: Session,
+    event_id: str,
+    source: str,
+    chunks: Iterable[list[schemas.TransactionIn]] | Iterable[TransactionColumns],
+    fallback_ept_id: str | None,
+    on_progress: Callable[[schemas.ImportSummary], None] | None,
+    at_boundary: Callable[[], bool] | None = None,
+) -> schemas.ImportSummary:
+    # Postgres fast path: rows are streamed into a temporary staging table with
+    # COPY and moved into transactions by a single INSERT ... SELECT per batch,
+    # which also resolves selling points and EPTs inside the database.
+    if fallback_ept_id and not db.get(models.EPT, fallback_ept_id):
+        fallback_ept_id = None
+    known = KnownKeys()
+    changes = versions.ChangeRun(event_id)
+    processed = inserted = skipped = errors = 0
+    batch: list[tuple] = []
+
+    def flush() -> None:
+        nonlocal inserted, skipped, errors
+        if batch:
+            try:
+                db.execute(CREATE_STAGING)
+                _copy_rows(db, batch)
+                result = db.execute(
+                    INSERT_STAGED,
+                    {"event_id": event_id, "source": source, "fallback_ept_id": fallback_ept_id},
+                ).all()
+                new_rows, unresolved, duplicates = _staged_counts(result, len(batch))
+                version = _record_inserted(db, event_id, new_rows, changes)
+                # ON COMMIT DELETE ROWS empties the staging table.
+                db.commit()
+            except Exception:
+                db.rollback()
+                changes.reset()
+                errors += len(batch)
+            else:
+                inserted += len(new_rows)
+                errors += unresolved
+                skipped += duplicates
+                known.add(row_hash for *_, row_hash in batch)
+                if version is not None:
+                    _publish_deltas(event_id, version, new_rows)
+            batch.clear()
+        if on_progress:
+            on_progress(
+                schemas.ImportSummary(
+                    processed=processed, inserted=inserted, skipped_duplicates=skipped, errors=errors
+                )
+            )
+
+    for chunk in chunks:
+        processed += len(chunk)
+        values = list(_row_values(chunk))
+        duplicates = known.duplicates([row_hash for *_, row_hash in values])
+        skipped += sum(duplicates)
+        batch.extend(row for row, duplicate in zip(values, duplicates) if not duplicate)
+        if len(batch) >= COPY_BATCH_SIZE or (at_boundary and at_boundary()):
+            flush()
+    flush()
+
+    return schemas.ImportSummary(
+        processed=processed, inserted=inserted, skipped_duplicates=skipped, errors=errors
+    )
+
+
+def import_file(
+    db: Session,
+    event_id: str,
+    parser: BaseParser,
+    file_obj: IO[bytes],
+    chunk_size: int,
+    filename: str | None = None,
+    fallback_ept_id: str | None = None,
+    on_progress: Callable[[schemas.ImportSummary], None] | None = None,
+) -> schemas.ImportSummary:
+    # Imports the part of the file the ledger has not seen yet; raises
+    # ledger.AlreadyImported for content that was already imported cleanly. A
+    # resumed import reports the counters of the whole file.
+    tracked = ledger.TrackedImport(db, event_id, file_obj, filename)
+
+    def progress(summary: schemas.ImportSummary) -> None:
+        summary = tracked.total(summary)
+        tracked.progress(summary)
+        if on_progress:
+            on_progress(summary)
+
+    summary = import_transactions(
+        db,
+        event_id,
+        parser.name,
+        tracked.chunks(parser, chunk_size),
+        fallback_ept_id,
+        progress,
+        tracked.at_block_end,
+    )
+    summary = tracked.total(summary)
+    tracked.finish(summary)
+    return summary
+
+
+def _failed_file(filename: str, parser: str | None, message: str) -> schemas.FileImportSummary:
+    return schemas.FileImportSummary(
+        filename=filename,
+        parser=parser,
+        processed=0,
+        inserted=0,
+        skipped_duplicates=0,
+        errors=0,
+        error_message=message,
+    )
+
+
+def import_files(
+    db: Session,
+    event_id: str,
+    files: list[tuple[str, str]],
+    parser: str | None,
+    pool: Executor,
+    fallback_ept_id: str | None = None,
+) -> schemas.BulkImportSummary:
+    # Files (name, path) are parsed concurrently in `pool` into spool files;
+    # each one is inserted here, chunk by chunk, as soon as it is parsed, so
+    # the database only sees one writer.
+    # `parser=None` picks the parser per file from its header. The ledger
+    # rejects files imported before and trims cumulative exports to their tail.
+    results: list[schemas.FileImportSummary | None] = [None] * len(files)
+    tracked: dict[int, ledger.TrackedImport] = {}
+    futures = {}
+    with ExitStack() as open_files:
+        for index, (filename, path) in enumerate(files):
+            # Kept open: the ledger hashes each file's tail once it is imported.
+            f = open_files.enter_context(open(path, "rb"))
+            try:
+                tracked[index] = ledger.TrackedImport(db, event_id, f, filename)
+            except ledger.AlreadyImported as exc:
+                results[index] = _failed_file(filename, parser, str(exc))
+                continue
+            futures[pool.submit(parse_path, path, parser, CHUNK_SIZE, tracked[index].start)] = index
+        for future in as_completed(futures):
+            index = futures[future]
+            filename = files[index][0]
+            try:
+                parser_name, spool = future.result()
+            except Exception as exc:
+                tracked[index].discard()
+                results[index] = _failed_file(filename, parser, str(exc))
+                continue
+            if not parser_name:
+                tracked[index].discard()
+                results[index] = _failed_file(filename, None, "No parser recognises the file header")
+                continue
+            summary = import_transactions(
+                db, event_id, parser_name, read_spool(spool), fallback_ept_id
+            )
+            summary = tracked[index].total(summary)
+            tracked[index].finish(summary)
+            results[index] = schemas.FileImportSummary(
+                filename=filename, parser=parser_name, **summary.model_dump()
+            )
+
+    return schemas.BulkImportSummary(
+        processed=sum(f.processed for f in results),
+        inserted=sum(f.inserted for f in results),
+        skipped_duplicates=sum(f.skipped_duplicates for f in results),
+        errors=sum(f.errors for f in results),
+        files=results,
+    )
@@ -0,0 +1,197 @@
+import hashlib
+import os
+import shutil
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from typing import IO, Iterable
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import ledger, models, schemas
+from db import SessionLocal, settings
+from importer import CHUNK_SIZE, import_file
+from parsers import PARSER_REGISTRY
+
+executor = ThreadPoolExecutor(max_workers=settings.import_workers, thread_name_prefix="import")
+parse_pool = ProcessPoolExecutor(max_workers=settings.import_processes)
+
+ACTIVE_STATUSES = (models.ImportJobStatus.queued, models.ImportJobStatus.running)
+
+
+def _store_upload(file_obj: IO[bytes]) -> tuple[str, str]:
+    os.makedirs(settings.import_dir, exist_ok=True)
+    path = os.path.join(settings.import_dir, f"{uuid.uuid4()}.upload")
+    digest = hashlib.sha256()
+    with open(path, "wb") as out:
+        while block := file_obj.read(1024 * 1024):
+            digest.update(block)
+            out.write(block)
+    return path, digest.hexdigest()
+
+
+def stage_uploads(
+    directory: str, uploads: Iterable[tuple[str | None, IO[bytes]]]
+) -> list[tuple[str, str]]:
+    # Writes each upload into `directory` so pool workers can open it by path;
+    # zip archives are expanded into one file per member.
+    staged = []
+
+    def stage(name: str, source: IO[bytes]) -> None:
+        path = os.path.join(directory, f"{uuid.uuid4()}.upload")
+        with open(path, "wb") as out:
+            shutil.copyfileobj(source, out, 1024 * 1024)
+        staged.append((name, path))
+
+    for filename, file_obj in uploads:
+        if zipfile.is_zipfile(file_obj):
+            file_obj.seek(0)
+            with zipfile.ZipFile(file_obj) as archive:
+                for member in archive.infolist():
+                    if member.is_dir() or member.filename.startswith("__MACOSX/"):
+                        continue
+                    with archive.open(member) as source:
+                        stage(member.filename, source)
+        else:
+            file_obj.seek(0)
+            stage(filename or f"file-{len(staged) + 1}", file_obj)
+    return staged
+
+
+def _active_job(db: Session, active_key: str) -> models.ImportJob | None:
+    return db.scalars(
+        select(models.ImportJob).where(models.ImportJob.active_key == active_key)
+    ).first()
+
+
+def submit_import(
+    db: Session,
+    event_id: str,
+    parser: str,
+    file_obj: IO[bytes],
+    filename: str | None = None,
+    fallback_ept_id: str | None = None,
+) -> models.ImportJob:
+    path, file_hash = _store_upload(file_obj)
+    if ledger.already_imported(db, event_id, file_hash):
+        os.remove(path)
+        raise ledger.AlreadyImported(f"{filename or 'File'} was already imported")
+    active_key = f"{event_id}:{file_hash}"
+    existing = _active_job(db, active_key)
+    if existing:
+        os.remove(path)
+        return existing
+
+    job = models.ImportJob(
+        event_id=event_id,
+        parser=parser,
+        fallback_ept_id=fallback_ept_id,
+        filename=filename,
+        file_path=path,
+        file_hash=file_hash,
+        active_key=active_key,
+    )
+    db.add(job)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another request registered the same file between our check and insert.
+        db.rollback()
+        os.remove(path)
+        return _active_job(db, active_key)
+    db.refresh(job)
+    executor.submit(run_import_job, job.id)
+    return job
+
+
+def run_import_job(job_id: str) -> None:
+    db = SessionLocal()
+    job = db.get(models.ImportJob, job_id)
+    if not job:
+        db.close()
+        return
+    file_path = job.file_path
+    try:
+        job.status = models.ImportJobStatus.running
+        job.started_at = datetime.utcnow()
+        db.commit()
+
+        def on_progress(progress: schemas.ImportSummary) -> None:
+            for field, value in progress.model_dump().items():
+                setattr(job, field, value)
+            db.commit()
+
+        parser_impl = PARSER_REGISTRY[job.parser]
+        with open(file_path, "rb") as f:
+            import_file(
+                db,
+                job.event_id,
+                parser_impl,
+                f,
+                CHUNK_SIZE,
+                job.filename,
+                job.fallback_ept_id,
+                on_progress=on_progress,
+            )
+        job.status = models.ImportJobStatus.succeeded
+    except Exception as exc:
+        db.rollback()
+        job.status = models.ImportJobStatus.failed
+        job.error_message = str(exc)
+    finally:
+        job.active_key = None
+        job.finished_at = datetime.utcnow()
+        db.commit()
+        db.close()
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+
+def resume_pending_jobs() -> None:
+    # Jobs interrupted by a restart are re-run from their stored upload; the
+    # import ledger resumes them after their last committed chunk.
+    db = SessionLocal()
+    try:
+        jobs = db.scalars(
+            select(models.ImportJob).where(models.ImportJob.status.in_(ACTIVE_STATUSES))
+        ).all()
+        for job in jobs:
+            if os.path.exists(job.file_path):
+                job.status = models.ImportJobStatus.queued
+                db.commit()
+                executor.submit(run_import_job, job.id)
+            else:
+                job.status = models.ImportJobStatus.failed
+                job.error_message = "Upload lost before the job could run"
+                job.active_key = None
+                job.finished_at = datetime.utcnow()
+                db.commit()
+    finally:
+        db.close()
+
+
+def job_status(job: models.ImportJob) -> schemas.ImportJobRead:
+    rate = 0.0
+    if job.started_at:
+        elapsed = ((job.finished_at or datetime.utcnow()) - job.started_at).total_seconds()
+        if elapsed > 0:
+            rate = job.processed / elapsed
+    return schemas.ImportJobRead(
+        id=job.id,
+        event_id=job.event_id,
+        parser=job.parser,
+        filename=job.filename,
+        status=job.status,
+        processed=job.processed,
+        inserted=job.inserted,
+        skipped_duplicates=job.skipped_duplicates,
+        errors=job.errors,
+        error_message=job.error_message,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+        rows_per_second=rate,
+    )
@@ -0,0 +1,237 @@
+import hashlib
+import io
+from typing import IO, Iterator
+
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import models, schemas
+from parsers import BaseParser, parse_chunks
+
+# Import ledger. Every file imported into an event is recorded with a committed
+# byte offset, the hash of the file up to it and, once complete, its content
+# hash, so that:
+# - a file whose content was already imported cleanly is rejected without
+#   parsing a single row (with one indexed lookup when its hash is known, as
+#   for background uploads);
+# - a cumulative export (an earlier file plus new rows appended) is parsed from
+#   where the earlier file's rows end;
+# - a crashed import of the same file resumes from its last committed chunk.
+# Offsets are line based, which assumes one CSV row per line (no quoted line
+# breaks), as in the providers' exports.
+
+LEDGER_BLOCK_BYTES = 4 * 1024 * 1024
+SUMMARY_FIELDS = ("processed", "inserted", "skipped_duplicates", "errors")
+
+
+class AlreadyImported(Exception):
+    pass
+
+
+def already_imported(db: Session, event_id: str, file_hash: str) -> bool:
+    entry = db.scalars(
+        select(models.ImportFile).where(
+            models.ImportFile.event_id == event_id, models.ImportFile.file_hash == file_hash
+        )
+    ).first()
+    return bool(entry and entry.completed and not entry.errors)
+
+
+def forget(db: Session, event_id: str) -> None:
+    # Called when transactions of the event are deleted: files recorded here may
+    # no longer be fully imported, so all of them are read again.
+    db.execute(delete(models.ImportFile).where(models.ImportFile.event_id == event_id))
+
+
+class TrackedImport:
+    def __init__(self, db: Session, event_id: str, file_obj: IO[bytes], filename: str | None = None):
+        # Hashes the file only up to the committed offsets of earlier imports
+        # that fit in it, which is what an earlier import of a prefix of this
+        # file would have recorded; the rest is hashed as it is imported.
+        self.db = db
+        self.file_obj = file_obj
+        file_obj.seek(0, io.SEEK_END)
+        size = file_obj.tell()
+        file_obj.seek(0)
+        self.header = file_obj.readline()
+        entries = db.scalars(
+            select(models.ImportFile).where(
+                models.ImportFile.event_id == event_id,
+                models.ImportFile.committed_offset > len(self.header),
+                models.ImportFile.committed_offset <= size,
+            )
+        ).all()
+        # Completed imports with errors are not used as a base: their unresolved
+        # rows may import now, so they are read again.
+        entries = [e for e in entries if not (e.completed and e.errors)]
+        hasher = hashlib.sha256(self.header)
+        position = len(self.header)
+        snapshots = {}
+        for boundary in sorted({e.committed_offset for e in entries}):
+            while position < boundary:
+                block = file_obj.read(min(LEDGER_BLOCK_BYTES, boundary - position))
+                if not block:
+                    break
+                hasher.update(block)
+                position += len(block)
+            snapshots[boundary] = hasher.copy()
+        matches = [e for e in entries if snapshots[e.committed_offset].hexdigest() == e.prefix_hash]
+
+        for e in matches:
+            if e.completed and e.size == size:
+                # Only a last line without a line break can follow the offset.
+                full = snapshots[e.committed_offset].copy()
+                file_obj.seek(e.committed_offset)
+                full.update(file_obj.read())
+                if full.hexdigest() == e.file_hash:
+                    raise AlreadyImported(f"{filename or 'File'} was already imported")
+
+        # At equal offsets an unfinished import is preferred, so it is resumed
+        # rather than recorded twice.
+        base = max(matches, key=lambda e: (e.committed_offset, not e.completed), default=None)
+        self.resumed = bool(base and not base.completed)
+        if self.resumed:
+            # An unfinished import of this file (or of a prefix of it): carry on
+            # after its last committed chunk, counting the rows it committed.
+            self.entry = base
+            self.entry.filename = filename
+            self.entry.size = size
+        else:
+            self.entry = models.ImportFile(
+                event_id=event_id,
+                filename=filename,
+                size=size,
+                processed=0,
+                inserted=0,
+                skipped_duplicates=0,
+                errors=0,
+            )
+            db.add(self.entry)
+        self.committed = schemas.ImportSummary(
+            **{field: getattr(self.entry, field) for field in SUMMARY_FIELDS}
+        )
+        if base:
+            self.hasher = snapshots[base.committed_offset].copy()
+            self.entry.committed_offset = base.committed_offset
+        else:
+            self.hasher = hashlib.sha256(self.header)
+            self.entry.committed_offset = len(self.header)
+        self.entry.prefix_hash = self.hasher.hexdigest()
+        db.commit()
+        # Bytes fed to self.hasher so far.
+        self.hashed_offset = self.entry.committed_offset
+        self.pending_offset = self.entry.committed_offset
+        self.pending_hash = self.entry.prefix_hash
+        self.block_end = False
+
+    @property
+    def start(self) -> int:
+        return self.entry.committed_offset
+
+    def total(self, summary: schemas.ImportSummary) -> schemas.ImportSummary:
+        # Counters of this run plus those of the part committed before it.
+        return schemas.ImportSummary(
+            **{
+                field: getattr(self.committed, field) + getattr(summary, field)
+                for field in SUMMARY_FIELDS
+            }
+        )
+
+    def _record(self, summary: schemas.ImportSummary) -> None:
+        for field in SUMMARY_FIELDS:
+            setattr(self.entry, field, getattr(summary, field))
+
+    def _blocks(self) -> Iterator[tuple[bytes, int]]:
+        # Line-aligned blocks from the hashed offset, with the offset after
+        # each block's last complete line.
+        self.file_obj.seek(self.hashed_offset)
+        rest = b""
+        while True:
+            data = self.file_obj.read(LEDGER_BLOCK_BYTES)
+            if not data:
+                break
+            data = rest + data
+            cut = data.rfind(b"\n") + 1
+            if not cut:
+                rest = data
+                continue
+            block, rest = data[:cut], data[cut:]
+            self.hasher.update(block)
+            self.hashed_offset += len(block)
+            yield block, self.hashed_offset
+        if rest:
+            # A last row without a line break is imported but not committed to
+            # the ledger: an export that later grows may still extend it.
+            yield rest, self.hashed_offset
+
+    def chunks(self, parser: BaseParser, chunk_size: int) -> Iterator:
+        # Parses each block on its own (header + rows). Just before the last
+        # chunk of a block is handed to the importer, the block end becomes the
+        # pending offset and block_end is set until the next chunk is handed
+        # out; the importer has committed everything it was handed by the time
+        # it reports progress.
+        for block, end in self._blocks():
+            data = self.header + block
+            parsed = iter(parse_chunks(parser, io.BytesIO(data), len(data), chunk_size))
+            chunk = next(parsed, None)
+            while chunk is not None:
+                following = next(parsed, None)
+                self.block_end = following is None
+                if self.block_end:
+                    self.pending_offset, self.pending_hash = end, self.hasher.hexdigest()
+                yield chunk
+                chunk = following
+
+    def at_block_end(self) -> bool:
+        # Whether the rows handed out so far are exactly those before the
+        # pending offset; importers that batch chunks flush there.
+        return self.block_end
+
+    def progress(self, total: schemas.ImportSummary) -> None:
+        # `total` (see total()) covers every row handed out so far, which are
+        # the rows before the pending offset only at a block end; progress
+        # reported in the middle of a block is not recorded.
+        if self.block_end and self.pending_offset != self.entry.committed_offset:
+            self.entry.committed_offset = self.pending_offset
+            self.entry.prefix_hash = self.pending_hash
+            self._record(total)
+            self.db.commit()
+
+    def discard(self) -> None:
+        # The file could not be parsed at all; a new entry would never resume.
+        if not self.resumed:
+            self.db.delete(self.entry)
+            self.db.commit()
+
+    def finish(self, total: schemas.ImportSummary) -> None:
+        # Every row was handed to the importer, whichever way it was parsed;
+        # hashes what chunks() did not read (the whole tail on the bulk path,
+        # where worker processes parse the file).
+        for _ in self._blocks():
+            pass
+        self.entry.committed_offset = self.hashed_offset
+        self.entry.prefix_hash = self.hasher.hexdigest()
+        full = self.hasher.copy()
+        self.file_obj.seek(self.hashed_offset)
+        full.update(self.file_obj.read())
+        file_hash = full.hexdigest()
+        entry_id = self.entry.id
+        # An earlier import of the same content that had errors is superseded.
+        self.db.execute(
+            delete(models.ImportFile).where(
+                models.ImportFile.event_id == self.entry.event_id,
+                models.ImportFile.file_hash == file_hash,
+                models.ImportFile.id != entry_id,
+            )
+        )
+        self.entry.file_hash = file_hash
+        self.entry.completed = True
+        self._record(total)
+        try:
+            self.db.commit()
+        except IntegrityError:
+            # A concurrent import of the same content finished first.
+            self.db.rollback()
+            self.db.execute(delete(models.ImportFile).where(models.ImportFile.id == entry_id))
+            self.db.commit()
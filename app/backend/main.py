@@ -1,10 +1,31 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
+import jobs, metrics
+from cache import summary_cache
+import db
 from db import Base, engine
 from routers import events
+from stream import publisher
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    publisher.start()
+    jobs.resume_pending_jobs()
+    yield
+    jobs.executor.shutdown(wait=False, cancel_futures=True)
+    jobs.parse_pool.shutdown(wait=False, cancel_futures=True)
+    publisher.stop()
+    if db.settings.db_async:
+        await db.async_engine.dispose()
+        await db.async_read_engine.dispose()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 Base.metadata.create_all(bind=engine)
 
@@ -14,7 +35,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Data-Version", "X-Next-Cursor", "Server-Timing"],
 )
+app.middleware("http")(metrics.middleware)
 
 app.include_router(events.router)
 
@@ -22,3 +45,13 @@ app.include_router(events.router)
 @app.get("/health")
 def health() -> dict[str, str]:
     return {"status": "ok"}
+
+
+@app.get("/cache/stats")
+def cache_stats() -> dict[str, int]:
+    return summary_cache.stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics() -> str:
+    return metrics.registry.render()
@@ -0,0 +1,246 @@
+import contextvars
+import cProfile
+import functools
+import inspect
+import io
+import pstats
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+
+from fastapi import Request
+from fastapi.responses import PlainTextResponse
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from db import settings
+
+try:
+    from pyinstrument import Profiler
+except ImportError:  # optional: falls back to cProfile
+    Profiler = None
+
+
+class RequestStats:
+    __slots__ = (
+        "queries",
+        "sql_seconds",
+        "rows",
+        "endpoint_seconds",
+        "handler_seconds",
+        "peak_bytes",
+        "profile",
+        "profile_output",
+    )
+
+    def __init__(self, profile: bool = False) -> None:
+        self.queries = 0
+        self.sql_seconds = 0.0
+        # Rows reported by the driver: every statement on Postgres (psycopg2
+        # buffers SELECT results), only INSERT/UPDATE/DELETE on SQLite.
+        self.rows = 0
+        self.endpoint_seconds = 0.0
+        self.handler_seconds = 0.0
+        self.peak_bytes: int | None = None
+        self.profile = profile
+        self.profile_output: str | None = None
+
+    @property
+    def serialize_seconds(self) -> float:
+        # Time FastAPI spends around the endpoint: request validation and
+        # response_model validation/encoding.
+        return max(0.0, self.handler_seconds - self.endpoint_seconds)
+
+
+# Stats of the request being served; the object is shared with the threadpool
+# and middleware tasks, which run in copies of the request's context.
+current: contextvars.ContextVar[RequestStats | None] = contextvars.ContextVar(
+    "request_stats", default=None
+)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    if current.get() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = current.get()
+    if stats is None:
+        return
+    started = conn.info["query_started"].pop()
+    stats.queries += 1
+    stats.sql_seconds += time.perf_counter() - started
+    if cursor.rowcount and cursor.rowcount > 0:
+        stats.rows += cursor.rowcount
+
+
+@event.listens_for(Engine, "handle_error")
+def _failed_execute(context):
+    if context.connection is not None and context.connection.info.get("query_started"):
+        context.connection.info["query_started"].pop()
+
+
+@contextmanager
+def _profiling(stats: RequestStats, async_mode: str = "disabled"):
+    if Profiler is not None:
+        profiler = Profiler(async_mode=async_mode)
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            stats.profile_output = profiler.output_text(unicode=True)
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(50)
+        stats.profile_output = out.getvalue()
+
+
+def _timed_endpoint(endpoint):
+    # Times (and with ?profile=1, profiles) the endpoint body alone. Sync
+    # endpoints run in the threadpool, so the profiler has to start there; for
+    # async ones it samples the event loop thread, other requests included.
+    if inspect.iscoroutinefunction(endpoint):
+
+        @functools.wraps(endpoint)
+        async def timed(*args, **kwargs):
+            stats = current.get()
+            started = time.perf_counter()
+            try:
+                if stats and stats.profile:
+                    with _profiling(stats, async_mode="enabled"):
+                        return await endpoint(*args, **kwargs)
+                return await endpoint(*args, **kwargs)
+            finally:
+                if stats:
+                    stats.endpoint_seconds += time.perf_counter() - started
+
+        return timed
+
+    @functools.wraps(endpoint)
+    def timed(*args, **kwargs):
+        stats = current.get()
+        started = time.perf_counter()
+        try:
+            if stats and stats.profile:
+                with _profiling(stats):
+                    return endpoint(*args, **kwargs)
+            return endpoint(*args, **kwargs)
+        finally:
+            if stats:
+                stats.endpoint_seconds += time.perf_counter() - started
+
+    return timed
+
+
+class TimedRoute(APIRoute):
+    def __init__(self, path: str, endpoint, **kwargs) -> None:
+        super().__init__(path, _timed_endpoint(endpoint), **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def timed_handler(request: Request):
+            stats = current.get()
+            started = time.perf_counter()
+            try:
+                return await handler(request)
+            finally:
+                if stats:
+                    stats.handler_seconds += time.perf_counter() - started
+
+        return timed_handler
+
+
+class Registry:
+    # Per-route totals exposed in the Prometheus text format.
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._totals: dict[tuple[str, str, int], list[float]] = defaultdict(lambda: [0.0] * 6)
+
+    def record(self, method: str, route: str, status: int, seconds: float, stats: RequestStats):
+        with self._lock:
+            totals = self._totals[method, route, status]
+            totals[0] += 1
+            totals[1] += seconds
+            totals[2] += stats.queries
+            totals[3] += stats.sql_seconds
+            totals[4] += stats.rows
+            totals[5] += stats.serialize_seconds
+
+    def render(self) -> str:
+        names = (
+            ("http_requests_total", "counter", "Requests served"),
+            ("http_request_seconds_total", "counter", "Time spent serving requests"),
+            ("db_queries_total", "counter", "SQL statements executed"),
+            ("db_query_seconds_total", "counter", "Time spent in SQL statements"),
+            ("db_rows_total", "counter", "Rows reported by the database driver"),
+            ("serialize_seconds_total", "counter", "Time spent validating and encoding"),
+        )
+        with self._lock:
+            snapshot = {key: list(values) for key, values in self._totals.items()}
+        lines = []
+        for i, (name, kind, help_text) in enumerate(names):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for (method, route, status), values in sorted(snapshot.items()):
+                labels = f'method="{method}",route="{route}",status="{status}"'
+                lines.append(f"{name}{{{labels}}} {values[i]:g}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def _server_timing(total: float, stats: RequestStats) -> str:
+    parts = [
+        f'db;dur={stats.sql_seconds * 1000:.2f};desc="{stats.queries} queries, {stats.rows} rows"',
+        f"endpoint;dur={stats.endpoint_seconds * 1000:.2f}",
+        f"serialize;dur={stats.serialize_seconds * 1000:.2f}",
+        f"total;dur={total * 1000:.2f}",
+    ]
+    if stats.peak_bytes is not None:
+        parts.append(f'mem;desc="peak {stats.peak_bytes / 1_048_576:.1f} MiB"')
+    return ", ".join(parts)
+
+
+async def middleware(request: Request, call_next):
+    profile = settings.debug and request.query_params.get("profile") == "1"
+    stats = RequestStats(profile=profile)
+    token = current.set(stats)
+    if settings.metrics_trace_memory:
+        # Process-wide: concurrent requests share the peak.
+        tracemalloc.reset_peak()
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        current.reset(token)
+    total = time.perf_counter() - started
+    if settings.metrics_trace_memory:
+        stats.peak_bytes = tracemalloc.get_traced_memory()[1]
+
+    route = request.scope.get("route")
+    registry.record(
+        request.method, getattr(route, "path", "unmatched"), response.status_code, total, stats
+    )
+    if stats.profile_output is not None:
+        response = PlainTextResponse(stats.profile_output)
+    response.headers["Server-Timing"] = _server_timing(total, stats)
+    return response
+
+
+if settings.metrics_trace_memory:
+    tracemalloc.start()
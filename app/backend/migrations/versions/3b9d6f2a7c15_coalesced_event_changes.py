@@ -0,0 +1,36 @@
+"""coalesced event changes
+
+Revision ID: 3b9d6f2a7c15
+Revises: e2a5c8f1b604
+Create Date: 2026-10-17 21:12:36.204817
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b9d6f2a7c15'
+down_revision: Union[str, Sequence[str], None] = 'e2a5c8f1b604'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing rows each cover a single version.
+    with op.batch_alter_table('event_changes') as batch_op:
+        batch_op.add_column(sa.Column('from_version', sa.Integer(), nullable=True))
+    op.execute('UPDATE event_changes SET from_version = version')
+    with op.batch_alter_table('event_changes') as batch_op:
+        batch_op.alter_column('from_version', existing_type=sa.Integer(), nullable=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Coalesced rows keep their last version; the versions before it read as
+    # unknown, so clients holding them get full responses.
+    with op.batch_alter_table('event_changes') as batch_op:
+        batch_op.drop_column('from_version')
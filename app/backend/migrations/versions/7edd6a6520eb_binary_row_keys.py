@@ -0,0 +1,88 @@
+"""binary row keys
+
+Revision ID: 7edd6a6520eb
+Revises: 90bdfd928c38
+Create Date: 2026-10-17 16:34:12.904513
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7edd6a6520eb'
+down_revision: Union[str, Sequence[str], None] = '90bdfd928c38'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Stored hex SHA-256 digests become their first 16 bytes, which is exactly the
+# key parsers.row_key computes for the same row.
+KEY_BYTES = 16
+
+
+def convert(to_binary: bool) -> None:
+    # SQLite has no in-place type change with a conversion expression, so the
+    # keys are rewritten into a new column.
+    new_type = sa.LargeBinary(length=KEY_BYTES) if to_binary else sa.String()
+    with op.batch_alter_table('transactions') as batch_op:
+        batch_op.add_column(sa.Column('source_row_key', new_type, nullable=True))
+    transactions = sa.table(
+        'transactions',
+        sa.column('id', sa.String()),
+        sa.column('source_row_hash'),
+        sa.column('source_row_key', new_type),
+    )
+    bind = op.get_bind()
+    rows = bind.execute(sa.select(transactions.c.id, transactions.c.source_row_hash)).all()
+    if rows:
+        bind.execute(
+            transactions.update()
+            .where(transactions.c.id == sa.bindparam('b_id'))
+            .values(source_row_key=sa.bindparam('b_key')),
+            [
+                {
+                    'b_id': tx_id,
+                    'b_key': bytes.fromhex(key)[:KEY_BYTES] if to_binary else key.hex(),
+                }
+                for tx_id, key in rows
+            ],
+        )
+    with op.batch_alter_table('transactions') as batch_op:
+        batch_op.drop_constraint('uix_source_hash', type_='unique')
+        batch_op.drop_column('source_row_hash')
+        batch_op.alter_column('source_row_key', new_column_name='source_row_hash', existing_type=new_type, nullable=False)
+    with op.batch_alter_table('transactions') as batch_op:
+        batch_op.create_unique_constraint('uix_source_hash', ['event_id', 'source', 'source_row_hash'])
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        convert(to_binary=True)
+        return
+    # Propagates to every partition and rebuilds uix_source_hash on the way.
+    op.alter_column(
+        'transactions',
+        'source_row_hash',
+        existing_type=sa.String(),
+        type_=sa.LargeBinary(length=KEY_BYTES),
+        postgresql_using=f"substring(decode(source_row_hash, 'hex') from 1 for {KEY_BYTES})",
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # The rest of the original digests is gone; keys come back as 32-character
+    # hex strings, so rows imported before the upgrade no longer match re-imports.
+    if op.get_bind().dialect.name != 'postgresql':
+        convert(to_binary=False)
+        return
+    op.alter_column(
+        'transactions',
+        'source_row_hash',
+        existing_type=sa.LargeBinary(length=KEY_BYTES),
+        type_=sa.String(),
+        postgresql_using="encode(source_row_hash, 'hex')",
+    )
@@ -0,0 +1,107 @@
+"""partition transactions by event
+
+Revision ID: 90bdfd928c38
+Revises: 50dc204ed1f5
+Create Date: 2026-10-17 16:20:41.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '90bdfd928c38'
+down_revision: Union[str, Sequence[str], None] = '50dc204ed1f5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = (
+    'id, event_id, selling_point_id, ept_id, amount_cents, currency, occurred_at,'
+    ' card_last4, source, source_row_hash'
+)
+
+
+def create_transactions(partitioned: bool) -> None:
+    primary_key = ('id', 'event_id') if partitioned else ('id',)
+    unique = ('event_id', 'source', 'source_row_hash') if partitioned else ('source', 'source_row_hash')
+    op.create_table('transactions',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('event_id', sa.String(), nullable=False),
+    sa.Column('selling_point_id', sa.String(), nullable=False),
+    sa.Column('ept_id', sa.String(), nullable=False),
+    sa.Column('amount_cents', sa.Integer(), nullable=False),
+    sa.Column('currency', sa.String(length=3), nullable=False),
+    sa.Column('occurred_at', sa.DateTime(), nullable=False),
+    sa.Column('card_last4', sa.String(length=4), nullable=False),
+    sa.Column('source', sa.String(), nullable=False),
+    sa.Column('source_row_hash', sa.String(), nullable=False),
+    sa.ForeignKeyConstraint(['ept_id'], ['epts.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['event_id'], ['events.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['selling_point_id'], ['selling_points.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint(*primary_key),
+    sa.UniqueConstraint(*unique, name='uix_source_hash'),
+    **({'postgresql_partition_by': 'LIST (event_id)'} if partitioned else {})
+    )
+    op.create_index('ix_transactions_event_occured', 'transactions', ['event_id', 'occurred_at'], unique=False)
+    op.create_index('ix_transactions_event_sp_ept_amount', 'transactions', ['event_id', 'selling_point_id', 'ept_id', 'amount_cents', 'occurred_at'], unique=False)
+
+
+def set_aside_transactions() -> None:
+    # Keep the old rows under another name and free the index/constraint names
+    # for the new table.
+    op.rename_table('transactions', 'transactions_old')
+    op.drop_index('ix_transactions_event_occured', table_name='transactions_old')
+    op.drop_index('ix_transactions_event_sp_ept_amount', table_name='transactions_old')
+    op.drop_constraint('uix_source_hash', 'transactions_old', type_='unique')
+    op.execute('ALTER TABLE transactions_old DROP CONSTRAINT transactions_pkey')
+
+
+def partition_name(event_id: str) -> str:
+    # Same naming as partitions.partition_name.
+    return 'transactions_' + ''.join(c for c in event_id if c.isalnum()).lower()
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        # SQLite keeps a plain table; only the dedup key becomes per event.
+        with op.batch_alter_table('transactions') as batch_op:
+            batch_op.drop_constraint('uix_source_hash', type_='unique')
+            batch_op.create_unique_constraint('uix_source_hash', ['event_id', 'source', 'source_row_hash'])
+        return
+
+    set_aside_transactions()
+    create_transactions(partitioned=True)
+    op.execute('CREATE TABLE transactions_default PARTITION OF transactions DEFAULT')
+    event_ids = op.get_bind().execute(sa.text('SELECT id FROM events')).scalars().all()
+    for event_id in event_ids:
+        bound = event_id.replace("'", "''")
+        op.execute(
+            f"CREATE TABLE {partition_name(event_id)} PARTITION OF transactions FOR VALUES IN ('{bound}')"
+        )
+    op.execute(f'INSERT INTO transactions ({COLUMNS}) SELECT {COLUMNS} FROM transactions_old')
+    op.drop_table('transactions_old')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        with op.batch_alter_table('transactions') as batch_op:
+            batch_op.drop_constraint('uix_source_hash', type_='unique')
+            batch_op.create_unique_constraint('uix_source_hash', ['source', 'source_row_hash'])
+        return
+
+    # Detached (archived) partitions are not part of transactions any more and
+    # are left in place as standalone tables.
+    set_aside_transactions()
+    create_transactions(partitioned=False)
+    # The same file imported into two events only survives once under the old,
+    # global dedup key.
+    op.execute(
+        f'INSERT INTO transactions ({COLUMNS}) SELECT {COLUMNS} FROM transactions_old'
+        ' ON CONFLICT DO NOTHING'
+    )
+    # Dropping the partitioned parent drops its attached partitions too.
+    op.drop_table('transactions_old')
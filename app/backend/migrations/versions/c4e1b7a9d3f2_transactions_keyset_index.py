@@ -0,0 +1,31 @@
+"""transactions keyset index
+
+Revision ID: c4e1b7a9d3f2
+Revises: 7edd6a6520eb
+Create Date: 2026-10-17 18:02:41.318207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e1b7a9d3f2'
+down_revision: Union[str, Sequence[str], None] = '7edd6a6520eb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # id breaks occurred_at ties, so transaction pages read straight off the index.
+    op.drop_index('ix_transactions_event_occured', table_name='transactions')
+    op.create_index('ix_transactions_event_occured', 'transactions', ['event_id', 'occurred_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_transactions_event_occured', table_name='transactions')
+    op.create_index('ix_transactions_event_occured', 'transactions', ['event_id', 'occurred_at'], unique=False)
@@ -1,15 +1,20 @@
 import enum
 import uuid
 from datetime import datetime
+from typing import Optional
 
 from sqlalchemy import (
+    DDL,
+    BigInteger,
     DateTime,
     Enum,
     ForeignKey,
     Integer,
+    LargeBinary,
     String,
     UniqueConstraint,
     Index,
+    event,
 )
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -22,6 +27,13 @@ class EPTProvider(str, enum.Enum):
     other = "other"
 
 
+class ImportJobStatus(str, enum.Enum):
+    queued = "queued"
+    running = "running"
+    succeeded = "succeeded"
+    failed = "failed"
+
+
 class Event(Base):
     __tablename__ = "events"
 
@@ -29,6 +41,8 @@ class Event(Base):
     name: Mapped[str] = mapped_column(String, unique=True)
     start_at: Mapped[datetime] = mapped_column(DateTime)
     end_at: Mapped[datetime] = mapped_column(DateTime)
+    # Bumped whenever the event's summary or timeline data changes.
+    data_version: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
 
     selling_points: Mapped[list["SellingPoint"]] = relationship(
         back_populates="event", cascade="all, delete-orphan"
@@ -36,6 +50,11 @@ class Event(Base):
     transactions: Mapped[list["Transaction"]] = relationship(
         back_populates="event", cascade="all, delete-orphan"
     )
+    import_jobs: Mapped[list["ImportJob"]] = relationship(
+        back_populates="event", cascade="all, delete-orphan"
+    )
+    import_files: Mapped[list["ImportFile"]] = relationship(cascade="all, delete-orphan")
+    changes: Mapped[list["EventChange"]] = relationship(cascade="all, delete-orphan")
 
 
 class SellingPoint(Base):
@@ -70,17 +89,33 @@ class EPT(Base):
     transactions: Mapped[list["Transaction"]] = relationship(
         back_populates="ept", cascade="all, delete-orphan"
     )
+    rollups: Mapped[list["TransactionRollup"]] = relationship(cascade="all, delete-orphan")
 
 
 class Transaction(Base):
     __tablename__ = "transactions"
     __table_args__ = (
-        UniqueConstraint("source", "source_row_hash", name="uix_source_hash"),
-        Index("ix_transactions_event_occured", "event_id", "occurred_at"),
+        # On Postgres the table is LIST-partitioned by event_id (see partitions.py),
+        # so the primary key and unique constraint have to include it.
+        UniqueConstraint("event_id", "source", "source_row_hash", name="uix_source_hash"),
+        # Ends in id so keyset pages over (occurred_at, id) need no sort.
+        Index("ix_transactions_event_occured", "event_id", "occurred_at", "id"),
+        # Covers the per-(selling point, EPT) aggregation used to (re)build rollups.
+        Index(
+            "ix_transactions_event_sp_ept_amount",
+            "event_id",
+            "selling_point_id",
+            "ept_id",
+            "amount_cents",
+            "occurred_at",
+        ),
+        {"postgresql_partition_by": "LIST (event_id)"},
     )
 
     id: Mapped[str] = mapped_column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    event_id: Mapped[str] = mapped_column(ForeignKey("events.id", ondelete="CASCADE"))
+    event_id: Mapped[str] = mapped_column(
+        ForeignKey("events.id", ondelete="CASCADE"), primary_key=True
+    )
     selling_point_id: Mapped[str] = mapped_column(
         ForeignKey("selling_points.id", ondelete="CASCADE")
     )
@@ -90,8 +125,109 @@ class Transaction(Base):
     occurred_at: Mapped[datetime] = mapped_column(DateTime)
     card_last4: Mapped[str] = mapped_column(String(4))
     source: Mapped[str] = mapped_column(String)
-    source_row_hash: Mapped[str] = mapped_column(String)
+    source_row_hash: Mapped[bytes] = mapped_column(LargeBinary(16))
 
     event: Mapped[Event] = relationship(back_populates="transactions")
     selling_point: Mapped[SellingPoint] = relationship(back_populates="transactions")
     ept: Mapped[EPT] = relationship(back_populates="transactions")
+
+
+# Rows for events without a partition of their own (e.g. created before
+# partitioning) land here.
+event.listen(
+    Transaction.__table__,
+    "after_create",
+    DDL("CREATE TABLE transactions_default PARTITION OF transactions DEFAULT").execute_if(
+        dialect="postgresql"
+    ),
+)
+
+
+class TransactionRollup(Base):
+    __tablename__ = "transaction_rollups"
+
+    event_id: Mapped[str] = mapped_column(
+        ForeignKey("events.id", ondelete="CASCADE"), primary_key=True
+    )
+    selling_point_id: Mapped[str] = mapped_column(
+        ForeignKey("selling_points.id", ondelete="CASCADE"), primary_key=True
+    )
+    ept_id: Mapped[str] = mapped_column(ForeignKey("epts.id", ondelete="CASCADE"), primary_key=True)
+    # End of the one-minute bucket: transactions with occurred_at in
+    # (bucket_end - 1 minute, bucket_end] are folded into this row.
+    bucket_end: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    sum_cents: Mapped[int] = mapped_column(BigInteger)
+    tx_count: Mapped[int] = mapped_column(Integer)
+    first_at: Mapped[datetime] = mapped_column(DateTime)
+    last_at: Mapped[datetime] = mapped_column(DateTime)
+
+
+class EventChange(Base):
+    __tablename__ = "event_changes"
+
+    event_id: Mapped[str] = mapped_column(
+        ForeignKey("events.id", ondelete="CASCADE"), primary_key=True
+    )
+    version: Mapped[int] = mapped_column(Integer, primary_key=True)
+    # The row covers versions from_version..version (one import's commits are
+    # coalesced into one row).
+    from_version: Mapped[int] = mapped_column(Integer)
+    # Earliest occurred_at touched by this change; NULL when everything may have
+    # changed (selling point/EPT edits, event date changes).
+    changed_from: Mapped[Optional[datetime]] = mapped_column(DateTime)
+
+
+class ImportJob(Base):
+    __tablename__ = "import_jobs"
+
+    id: Mapped[str] = mapped_column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    event_id: Mapped[str] = mapped_column(ForeignKey("events.id", ondelete="CASCADE"))
+    parser: Mapped[str] = mapped_column(String)
+    fallback_ept_id: Mapped[Optional[str]] = mapped_column(String)
+    filename: Mapped[Optional[str]] = mapped_column(String)
+    file_path: Mapped[str] = mapped_column(String)
+    file_hash: Mapped[str] = mapped_column(String)
+    # Set to "<event_id>:<file_hash>" while the job is queued or running so the
+    # database guarantees a single active job per file; cleared when it finishes.
+    active_key: Mapped[Optional[str]] = mapped_column(String, unique=True)
+    status: Mapped[ImportJobStatus] = mapped_column(
+        Enum(ImportJobStatus), default=ImportJobStatus.queued
+    )
+    processed: Mapped[int] = mapped_column(Integer, default=0)
+    inserted: Mapped[int] = mapped_column(Integer, default=0)
+    skipped_duplicates: Mapped[int] = mapped_column(Integer, default=0)
+    errors: Mapped[int] = mapped_column(Integer, default=0)
+    error_message: Mapped[Optional[str]] = mapped_column(String)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+
+    event: Mapped[Event] = relationship(back_populates="import_jobs")
+
+
+class ImportFile(Base):
+    # Import ledger: one row per file imported into an event; file_hash is set
+    # once the import completes (see ledger.py).
+    __tablename__ = "import_files"
+    __table_args__ = (UniqueConstraint("event_id", "file_hash", name="uix_import_file_hash"),)
+
+    id: Mapped[str] = mapped_column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    event_id: Mapped[str] = mapped_column(ForeignKey("events.id", ondelete="CASCADE"))
+    filename: Mapped[Optional[str]] = mapped_column(String)
+    file_hash: Mapped[Optional[str]] = mapped_column(String)
+    size: Mapped[int] = mapped_column(BigInteger)
+    # High-water mark: every row before this byte offset (always at a line
+    # boundary) is committed; prefix_hash is the SHA-256 of those bytes.
+    committed_offset: Mapped[int] = mapped_column(BigInteger)
+    prefix_hash: Mapped[str] = mapped_column(String)
+    completed: Mapped[bool] = mapped_column(default=False)
+    # Import counters for the rows before committed_offset, so a resumed import
+    # reports the whole file.
+    processed: Mapped[int] = mapped_column(Integer, default=0)
+    inserted: Mapped[int] = mapped_column(Integer, default=0)
+    skipped_duplicates: Mapped[int] = mapped_column(Integer, default=0)
+    errors: Mapped[int] = mapped_column(Integer, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
+    )
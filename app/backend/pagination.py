@@ -0,0 +1,57 @@
+import base64
+import json
+from datetime import datetime
+from typing import Sequence
+
+from fastapi import HTTPException
+from sqlalchemy import Select, and_, or_
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 5000
+# Set when there is a next page; pass it back as ?cursor= to fetch it.
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(values: Sequence) -> str:
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, columns: Sequence) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError(cursor)
+        return [
+            datetime.fromisoformat(value)
+            if column.type.python_type is datetime
+            else column.type.python_type(value)
+            for column, value in zip(columns, values)
+        ]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _after(columns: Sequence, values: Sequence):
+    # (a, b) > (x, y) spelled as a >= x AND (a > x OR b > y), so the leading
+    # column stays usable as an index range condition.
+    first, *rest = columns
+    value, *more = values
+    if not rest:
+        return first > value
+    return and_(first >= value, or_(first > value, _after(rest, more)))
+
+
+def keyset(stmt: Select, columns: Sequence, cursor: str | None, limit: int) -> Select:
+    # Orders by `columns`, which must end in a unique column, starts after the
+    # cursor's row and fetches one extra row to tell whether a next page exists.
+    if cursor is not None:
+        stmt = stmt.where(_after(columns, decode_cursor(cursor, columns)))
+    return stmt.order_by(*columns).limit(limit + 1)
+
+
+def page(rows: list, columns: Sequence, limit: int) -> tuple[list, str | None]:
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor([getattr(rows[-1], column.key) for column in columns])
@@ -1,20 +1,148 @@
 import csv
 import hashlib
+import io
+import os
+import pickle
 from datetime import datetime
-from typing import Iterable, Protocol, IO
+from itertools import islice
+from typing import Iterable, Iterator, Protocol, IO
 
 from schemas import TransactionIn
 
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+except ImportError:  # optional: the columnar path falls back to the csv module
+    pa = None
+
+ROW_KEY_BYTES = 16
+
+# Uploads at least this large are parsed with parse_columns() instead of
+# building one TransactionIn per row.
+COLUMNAR_MIN_BYTES = 1024 * 1024
+
+
+class TransactionColumns:
+    # A chunk of parsed transactions as parallel lists, one per TransactionIn
+    # field, already converted to the right types.
+    __slots__ = (
+        "selling_point_name",
+        "ept_label",
+        "amount_cents",
+        "currency",
+        "occurred_at",
+        "card_last4",
+        "source_row_hash",
+    )
+
+    def __init__(
+        self,
+        selling_point_name: list[str],
+        ept_label: list[str],
+        amount_cents: list[int],
+        currency: list[str],
+        occurred_at: list[datetime],
+        card_last4: list[str],
+        source_row_hash: list[bytes],
+    ) -> None:
+        self.selling_point_name = selling_point_name
+        self.ept_label = ept_label
+        self.amount_cents = amount_cents
+        self.currency = currency
+        self.occurred_at = occurred_at
+        self.card_last4 = card_last4
+        self.source_row_hash = source_row_hash
+
+    def __len__(self) -> int:
+        return len(self.source_row_hash)
+
+    def columns(self) -> list[list]:
+        return [getattr(self, field) for field in self.__slots__]
+
+    def rows(self) -> Iterator[tuple]:
+        return zip(*self.columns())
+
+    def split(self, size: int) -> Iterator["TransactionColumns"]:
+        for start in range(0, len(self), size):
+            yield TransactionColumns(*(col[start : start + size] for col in self.columns()))
+
 
 class BaseParser(Protocol):
     name: str
+    expected_fields: set[str]
 
     def sniff(self, header: list[str]) -> bool:
         ...
 
-    def parse(self, file_obj: IO[bytes]) -> Iterable[TransactionIn]:
+    def parse(
+        self, file_obj: IO[bytes], chunk_size: int | None = None
+    ) -> Iterable[TransactionIn] | Iterable[list[TransactionIn]]:
         ...
 
+    def parse_columns(self, file_obj: IO[bytes], chunk_size: int) -> Iterator[TransactionColumns]:
+        ...
+
+
+def iter_chunks(items: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def iter_text_rows(file_obj: IO[bytes]) -> Iterator[dict[str, str]]:
+    # Decode incrementally instead of holding the raw bytes, the decoded text and
+    # its lines in memory together; detach so the upload itself stays open.
+    text = io.TextIOWrapper(file_obj, encoding="utf-8", newline="")
+    try:
+        yield from csv.DictReader(text)
+    finally:
+        text.detach()
+
+
+def row_key(*values: str) -> bytes:
+    # Dedup key of a source row: the SHA-256 of its raw fields truncated to 16
+    # bytes, so keys stored as hex digests convert in place by truncation.
+    return hashlib.sha256("|".join(values).encode()).digest()[:ROW_KEY_BYTES]
+
+
+def hash_rows(*columns: list[str]) -> list[bytes]:
+    sha256 = hashlib.sha256
+    return [
+        sha256("|".join(values).encode()).digest()[:ROW_KEY_BYTES] for values in zip(*columns)
+    ]
+
+
+def read_header(file_obj: IO[bytes]) -> list[str]:
+    text = io.TextIOWrapper(file_obj, encoding="utf-8", newline="")
+    try:
+        return next(csv.reader(text), [])
+    finally:
+        text.detach()
+
+
+class TailReader(io.RawIOBase):
+    # The header line followed by the file from `offset` on: the rows of a
+    # cumulative export that an earlier import has not covered yet.
+    def __init__(self, file_obj: IO[bytes], offset: int):
+        file_obj.seek(0)
+        self.pending = file_obj.readline()
+        file_obj.seek(max(offset, len(self.pending)))
+        self.file_obj = file_obj
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self.pending:
+            n = min(len(buffer), len(self.pending))
+            buffer[:n] = self.pending[:n]
+            self.pending = self.pending[n:]
+            return n
+        data = self.file_obj.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
 
 class WorldlineMockParser:
     name = "mock_worldline"
@@ -27,25 +155,82 @@ class WorldlineMockParser:
         "occurred_at",
         "card_last4",
     }
+    # Raw columns in the order they are joined for source_row_hash.
+    hashed_fields = ("selling_point", "ept", "amount_cents", "currency", "occurred_at", "card_last4")
 
     def sniff(self, header: list[str]) -> bool:
         return set(header) >= self.expected_fields
 
-    def parse(self, file_obj: IO[bytes]) -> Iterable[TransactionIn]:
-        text = file_obj.read().decode("utf-8")
-        reader = csv.DictReader(text.splitlines())
-        for row in reader:
-            normalized = "|".join(
-                [
-                    row["selling_point"],
-                    row["ept"],
-                    row["amount_cents"],
-                    row["currency"],
-                    row["occurred_at"],
-                    row["card_last4"],
-                ]
-            )
-            source_row_hash = hashlib.sha256(normalized.encode()).hexdigest()
+    def parse(
+        self, file_obj: IO[bytes], chunk_size: int | None = None
+    ) -> Iterable[TransactionIn] | Iterable[list[TransactionIn]]:
+        rows = self._parse_rows(file_obj)
+        if chunk_size:
+            return iter_chunks(rows, chunk_size)
+        return rows
+
+    def parse_columns(self, file_obj: IO[bytes], chunk_size: int) -> Iterator[TransactionColumns]:
+        if pa is not None:
+            batches = self._arrow_columns(file_obj)
+        else:
+            batches = self._csv_columns(file_obj, chunk_size)
+        for batch in batches:
+            yield from batch.split(chunk_size)
+
+    def _columns(
+        self, raw: dict[str, list[str]], amounts: list[int], times: list[datetime]
+    ) -> TransactionColumns:
+        return TransactionColumns(
+            selling_point_name=raw["selling_point"],
+            ept_label=raw["ept"],
+            amount_cents=amounts,
+            currency=raw["currency"],
+            occurred_at=times,
+            card_last4=raw["card_last4"],
+            source_row_hash=hash_rows(*(raw[field] for field in self.hashed_fields)),
+        )
+
+    def _arrow_columns(self, file_obj: IO[bytes]) -> Iterator[TransactionColumns]:
+        reader = pa_csv.open_csv(
+            file_obj,
+            convert_options=pa_csv.ConvertOptions(
+                include_columns=list(self.hashed_fields),
+                column_types={field: pa.string() for field in self.hashed_fields},
+                strings_can_be_null=False,
+            ),
+        )
+        for batch in reader:
+            occurred_at = batch.column("occurred_at")
+            try:
+                times = pc.cast(occurred_at, pa.timestamp("us")).to_pylist()
+            except pa.ArrowInvalid:
+                # Offsets and other ISO forms Arrow does not cast natively.
+                times = list(map(datetime.fromisoformat, occurred_at.to_pylist()))
+            raw = {field: batch.column(field).to_pylist() for field in self.hashed_fields}
+            amounts = pc.cast(batch.column("amount_cents"), pa.int64()).to_pylist()
+            yield self._columns(raw, amounts, times)
+
+    def _csv_columns(self, file_obj: IO[bytes], chunk_size: int) -> Iterator[TransactionColumns]:
+        text = io.TextIOWrapper(file_obj, encoding="utf-8", newline="")
+        try:
+            reader = csv.reader(text)
+            header = next(reader, [])
+            width = len(header)
+            indexes = [header.index(field) for field in self.hashed_fields]
+            for rows in iter_chunks(reader, chunk_size):
+                if any(len(row) != width for row in rows):
+                    raise ValueError("Row with a different number of fields than the header")
+                columns = list(zip(*rows))
+                raw = {field: list(columns[i]) for field, i in zip(self.hashed_fields, indexes)}
+                amounts = list(map(int, raw["amount_cents"]))
+                times = list(map(datetime.fromisoformat, raw["occurred_at"]))
+                yield self._columns(raw, amounts, times)
+        finally:
+            text.detach()
+
+    def _parse_rows(self, file_obj: IO[bytes]) -> Iterator[TransactionIn]:
+        for row in iter_text_rows(file_obj):
+            source_row_hash = row_key(*(row[field] for field in self.hashed_fields))
             yield TransactionIn(
                 selling_point_name=row["selling_point"],
                 ept_label=row["ept"],
@@ -58,3 +243,60 @@ class WorldlineMockParser:
 
 
 PARSER_REGISTRY: dict[str, BaseParser] = {"mock_worldline": WorldlineMockParser()}
+
+
+def detect_parser(header: list[str]) -> BaseParser | None:
+    # When several parsers accept the header, the one expecting the most of its
+    # columns is the most specific match.
+    matches = [p for p in PARSER_REGISTRY.values() if p.sniff(header)]
+    return max(matches, key=lambda p: len(p.expected_fields), default=None)
+
+
+def parse_chunks(
+    parser: BaseParser, file_obj: IO[bytes], size: int | None, chunk_size: int
+) -> Iterable[list[TransactionIn]] | Iterable[TransactionColumns]:
+    # Small files keep the per-row TransactionIn path; large ones are parsed and
+    # converted column by column.
+    if size is not None and size >= COLUMNAR_MIN_BYTES:
+        return parser.parse_columns(file_obj, chunk_size)
+    return parser.parse(file_obj, chunk_size=chunk_size)
+
+
+def parse_path(
+    path: str, parser_name: str | None, chunk_size: int, offset: int = 0
+) -> tuple[str | None, str | None]:
+    # Runs in the import process pool: parsing and row hashing happen off the
+    # API process. Chunks are pickled one after another to a spool file next to
+    # `path` as they are parsed, so neither the worker nor the API process holds
+    # more than one chunk of a file; read them back with read_spool(). Rows
+    # before `offset` (past the header) are skipped.
+    with open(path, "rb") as f:
+        header = read_header(f)
+        if parser_name:
+            parser = PARSER_REGISTRY[parser_name]
+            if not parser.sniff(header):
+                raise ValueError(f"File header does not match parser {parser_name!r}")
+        else:
+            parser = detect_parser(header)
+            if not parser:
+                return None, None
+        size = os.path.getsize(path)
+        source = io.BufferedReader(TailReader(f, offset))
+        spool = path + ".chunks"
+        with open(spool, "wb") as out:
+            for chunk in parse_chunks(parser, source, size - offset, chunk_size):
+                pickle.dump(chunk, out, pickle.HIGHEST_PROTOCOL)
+        return parser.name, spool
+
+
+def read_spool(spool: str) -> Iterator[list[TransactionIn]] | Iterator[TransactionColumns]:
+    # Chunks written by parse_path, one at a time; the spool is removed once read.
+    try:
+        with open(spool, "rb") as f:
+            while True:
+                try:
+                    yield pickle.load(f)
+                except EOFError:
+                    return
+    finally:
+        os.remove(spool)
@@ -0,0 +1,119 @@
+import argparse
+
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+
+import models
+from db import SessionLocal
+
+# On Postgres `transactions` is LIST-partitioned by event_id: every event gets its
+# own partition, so imports only check uniqueness against that event's rows and
+# summary/timeline scans never touch other seasons. SQLite keeps a plain table
+# and every function here is a no-op there.
+DEFAULT_PARTITION = "transactions_default"
+
+
+def partition_name(event_id: str) -> str:
+    return "transactions_" + "".join(c for c in event_id if c.isalnum()).lower()
+
+
+def _literal(event_id: str) -> str:
+    # Partition bounds cannot be bound parameters.
+    return "'" + event_id.replace("'", "''") + "'"
+
+
+def _is_partitioned(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def _exists(db: Session, name: str) -> bool:
+    return db.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}).scalar_one()
+
+
+def _is_attached(db: Session, name: str) -> bool:
+    return db.execute(
+        text(
+            "SELECT EXISTS (SELECT 1 FROM pg_inherits"
+            " WHERE inhrelid = to_regclass(:name) AND inhparent = 'transactions'::regclass)"
+        ),
+        {"name": name},
+    ).scalar_one()
+
+
+def create(db: Session, event_id: str) -> None:
+    # Runs inside the caller's transaction. Rows the event already has in the
+    # default partition are moved over before the new partition is attached,
+    # otherwise Postgres refuses to attach it.
+    if not _is_partitioned(db):
+        return
+    name = partition_name(event_id)
+    if _exists(db, name):
+        return
+    db.execute(
+        text(f"CREATE TABLE {name} (LIKE transactions INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+    )
+    db.execute(
+        text(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE event_id = :event_id RETURNING *)"
+            f" INSERT INTO {name} SELECT * FROM moved"
+        ),
+        {"event_id": event_id},
+    )
+    attach(db, event_id)
+
+
+def attach(db: Session, event_id: str) -> None:
+    if not _is_partitioned(db):
+        return
+    name = partition_name(event_id)
+    if _is_attached(db, name):
+        return
+    db.execute(
+        text(f"ALTER TABLE transactions ATTACH PARTITION {name} FOR VALUES IN ({_literal(event_id)})")
+    )
+
+
+def detach(db: Session, event_id: str) -> None:
+    # Archives a finished event: its partition becomes a standalone table that can
+    # be dumped or dropped without touching live data. Summaries keep working from
+    # the rollups; raw-transaction reads for the event come back empty until it is
+    # attached again.
+    if not _is_partitioned(db):
+        return
+    name = partition_name(event_id)
+    if _is_attached(db, name):
+        db.execute(text(f"ALTER TABLE transactions DETACH PARTITION {name}"))
+
+
+def drop(db: Session, event_id: str) -> None:
+    if _is_partitioned(db):
+        db.execute(text(f"DROP TABLE IF EXISTS {partition_name(event_id)}"))
+
+
+def run(action: str, event_ids: list[str] | None = None) -> None:
+    db = SessionLocal()
+    try:
+        if not _is_partitioned(db):
+            print("transactions is not partitioned on this database; nothing to do")
+            return
+        if not event_ids:
+            event_ids = list(db.scalars(select(models.Event.id)))
+        handler, done = {
+            "create": (create, "Created"),
+            "attach": (attach, "Attached"),
+            "detach": (detach, "Detached"),
+        }[action]
+        for event_id in event_ids:
+            handler(db, event_id)
+            db.commit()
+            print(f"{done} partition {partition_name(event_id)} for event {event_id}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    cli = argparse.ArgumentParser(description="Manage per-event partitions of the transactions table")
+    cli.add_argument("action", choices=["create", "attach", "detach"])
+    cli.add_argument("event_ids", nargs="*", help="events to act on (default: all)")
+    args = cli.parse_args()
+    run(args.action, args.event_ids)
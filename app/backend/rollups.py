@@ -0,0 +1,149 @@
+import argparse
+import functools
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Iterable
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+import models, versions
+from db import SessionLocal
+from parsers import iter_chunks
+
+ROLLUP_STEP = timedelta(minutes=1)
+UPSERT_CHUNK_SIZE = 1000
+
+
+def bucket_end(ts: datetime) -> datetime:
+    floor = ts.replace(second=0, microsecond=0)
+    return floor if floor == ts else floor + ROLLUP_STEP
+
+
+def is_aligned(start: datetime, step: timedelta) -> bool:
+    # Reading rollups is exact only when every requested bucket boundary is
+    # also a rollup boundary.
+    return bucket_end(start) == start and step % ROLLUP_STEP == timedelta(0)
+
+
+class Totals:
+    __slots__ = ("total_cents", "tx_count", "first_at", "last_at")
+
+    def __init__(self) -> None:
+        self.total_cents = 0
+        self.tx_count = 0
+        self.first_at: datetime | None = None
+        self.last_at: datetime | None = None
+
+    def add(self, total_cents: int, tx_count: int, first_at: datetime, last_at: datetime) -> None:
+        self.total_cents += total_cents
+        self.tx_count += tx_count
+        if self.first_at is None or first_at < self.first_at:
+            self.first_at = first_at
+        if self.last_at is None or last_at > self.last_at:
+            self.last_at = last_at
+
+    @property
+    def avg_ticket_cents(self) -> float:
+        return self.total_cents / self.tx_count if self.tx_count else 0.0
+
+
+@functools.cache
+def _upsert(dialect_name: str):
+    # Executed with a list of row dicts, so the compiled statement is cached
+    # and the rows are batched by insertmanyvalues.
+    table = models.TransactionRollup.__table__
+    if dialect_name == "postgresql":
+        dialect, least, greatest = postgresql, func.least, func.greatest
+    else:
+        # SQLite's multi-argument min()/max() are scalar functions.
+        dialect, least, greatest = sqlite, func.min, func.max
+    stmt = dialect.insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=["event_id", "selling_point_id", "ept_id", "bucket_end"],
+        set_={
+            "sum_cents": table.c.sum_cents + stmt.excluded.sum_cents,
+            "tx_count": table.c.tx_count + stmt.excluded.tx_count,
+            "first_at": least(table.c.first_at, stmt.excluded.first_at),
+            "last_at": greatest(table.c.last_at, stmt.excluded.last_at),
+        },
+    )
+
+
+def apply(db: Session, event_id: str, inserted: Iterable[tuple[str, str, datetime, int]]) -> None:
+    buckets: dict[tuple[str, str, datetime], Totals] = defaultdict(Totals)
+    for sp_id, ept_id, occurred_at, amount_cents in inserted:
+        buckets[sp_id, ept_id, bucket_end(occurred_at)].add(amount_cents, 1, occurred_at, occurred_at)
+    rows = (
+        {
+            "event_id": event_id,
+            "selling_point_id": sp_id,
+            "ept_id": ept_id,
+            "bucket_end": end,
+            "sum_cents": t.total_cents,
+            "tx_count": t.tx_count,
+            "first_at": t.first_at,
+            "last_at": t.last_at,
+        }
+        for (sp_id, ept_id, end), t in buckets.items()
+    )
+    for chunk in iter_chunks(rows, UPSERT_CHUNK_SIZE):
+        db.execute(_upsert(db.get_bind().dialect.name), chunk)
+
+
+def totals(db: Session, event_id: str) -> tuple[dict[str, Totals], dict[str, Totals]]:
+    # One GROUP BY (selling_point_id, ept_id) pass, rolled up per selling point
+    # and per EPT here rather than with a second scan.
+    rollup = models.TransactionRollup
+    rows = db.execute(
+        select(
+            rollup.selling_point_id,
+            rollup.ept_id,
+            func.sum(rollup.sum_cents),
+            func.sum(rollup.tx_count),
+            func.min(rollup.first_at),
+            func.max(rollup.last_at),
+        )
+        .where(rollup.event_id == event_id)
+        .group_by(rollup.selling_point_id, rollup.ept_id)
+    )
+    sp_totals: dict[str, Totals] = defaultdict(Totals)
+    ept_totals: dict[str, Totals] = defaultdict(Totals)
+    for sp_id, ept_id, *values in rows:
+        sp_totals[sp_id].add(*values)
+        ept_totals[ept_id].add(*values)
+    return sp_totals, ept_totals
+
+
+def rebuild(db: Session, event_id: str) -> None:
+    db.execute(
+        delete(models.TransactionRollup).where(models.TransactionRollup.event_id == event_id)
+    )
+    tx = models.Transaction
+    inserted = db.execute(
+        select(tx.selling_point_id, tx.ept_id, tx.occurred_at, tx.amount_cents)
+        .where(tx.event_id == event_id)
+        .execution_options(yield_per=10_000)
+    )
+    apply(db, event_id, inserted)
+    versions.bump(db, event_id)
+    db.commit()
+
+
+def run(event_ids: list[str] | None = None) -> None:
+    db = SessionLocal()
+    try:
+        if not event_ids:
+            event_ids = list(db.scalars(select(models.Event.id)))
+        for event_id in event_ids:
+            rebuild(db, event_id)
+            print(f"Rebuilt rollups for event {event_id}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    cli = argparse.ArgumentParser(description="Rebuild transaction rollups from raw transactions")
+    cli.add_argument("event_ids", nargs="*", help="events to rebuild (default: all)")
+    run(cli.parse_args().event_ids)
@@ -1,27 +1,72 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func
-from sqlalchemy.exc import IntegrityError
-from datetime import timedelta, datetime
-from collections import defaultdict
-
-import models, schemas
-from db import get_db
-from parsers import PARSER_REGISTRY
-
-router = APIRouter(prefix="/events", tags=["events"])
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, UploadFile, File, Form
+from sqlalchemy import select
+from sqlalchemy.orm import Session, selectinload
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from datetime import datetime
+from typing import Literal
+import asyncio
+import json
+import os
+import re
+import tempfile
+
+import exports, fastjson, jobs, ledger, metrics, models, partitions, rollups, schemas, timeline, versions
+from db import QueryRunner, SessionLocal, get_db, get_query_runner, get_read_query_runner, settings
+from importer import CHUNK_SIZE, import_file, import_files, preview
+from pagination import DEFAULT_LIMIT, MAX_LIMIT, NEXT_CURSOR_HEADER, keyset, page
+from parsers import PARSER_REGISTRY, BaseParser, detect_parser, read_header
+from cache import summary_cache
+from fastjson import FastJSONResponse
+from stream import publisher
+
+router = APIRouter(prefix="/events", tags=["events"], route_class=metrics.TimedRoute)
+
+STREAM_KEEPALIVE_SECONDS = 15
+# Keyset orders of the list endpoints; each ends in a unique column.
+EVENT_ORDER = (models.Event.start_at, models.Event.id)
+SELLING_POINT_ORDER = (models.SellingPoint.name, models.SellingPoint.id)
+EPT_ORDER = (models.EPT.label, models.EPT.id)
+TRANSACTION_ORDER = (models.Transaction.occurred_at, models.Transaction.id)
+TRANSACTION_FIELDS = (
+    "id",
+    "selling_point_id",
+    "ept_id",
+    "amount_cents",
+    "currency",
+    "occurred_at",
+    "card_last4",
+    "source",
+)
+
+
+async def _list_page(
+    db: QueryRunner, response: Response, stmt, order, cursor: str | None, limit: int
+) -> list:
+    rows = await db.run(lambda session: session.scalars(keyset(stmt, order, cursor, limit)).all())
+    rows, next_cursor = page(rows, order, limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return rows
 
 
 # Event CRUD
 @router.get("/", response_model=list[schemas.EventRead])
-def list_events(db: Session = Depends(get_db)):
-    return db.query(models.Event).all()
+async def list_events(
+    response: Response,
+    cursor: str | None = None,
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    db: QueryRunner = Depends(get_query_runner),
+):
+    return await _list_page(db, response, select(models.Event), EVENT_ORDER, cursor, limit)
 
 
 @router.post("/", response_model=schemas.EventRead)
 def create_event(event_in: schemas.EventCreate, db: Session = Depends(get_db)):
     event = models.Event(**event_in.dict())
     db.add(event)
+    db.flush()
+    partitions.create(db, event.id)
     db.commit()
     db.refresh(event)
     return event
@@ -42,6 +87,7 @@ def update_event(event_id: str, event_in: schemas.EventUpdate, db: Session = Dep
         raise HTTPException(status_code=404, detail="Event not found")
     for field, value in event_in.dict(exclude_unset=True).items():
         setattr(event, field, value)
+    versions.bump(db, event_id)
     db.commit()
     db.refresh(event)
     return event
@@ -53,16 +99,30 @@ def delete_event(event_id: str, db: Session = Depends(get_db)):
     if not event:
         raise HTTPException(status_code=404, detail="Event not found")
     db.delete(event)
+    db.flush()
+    partitions.drop(db, event_id)
+    versions.mark_changed(db, event_id)
     db.commit()
     return {"ok": True}
 
 
 # Selling Points CRUD
-@router.get("/{event_id}/selling-points", response_model=list[schemas.SellingPointRead])
-def list_selling_points(event_id: str, db: Session = Depends(get_db)):
+def _selling_points(db: Session, event_id: str) -> list[models.SellingPoint]:
     return db.query(models.SellingPoint).filter_by(event_id=event_id).all()
 
 
+@router.get("/{event_id}/selling-points", response_model=list[schemas.SellingPointRead])
+async def list_selling_points(
+    event_id: str,
+    response: Response,
+    cursor: str | None = None,
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    db: QueryRunner = Depends(get_query_runner),
+):
+    stmt = select(models.SellingPoint).where(models.SellingPoint.event_id == event_id)
+    return await _list_page(db, response, stmt, SELLING_POINT_ORDER, cursor, limit)
+
+
 @router.post("/{event_id}/selling-points", response_model=schemas.SellingPointRead)
 def create_selling_point(event_id: str, sp_in: schemas.SellingPointCreate, db: Session = Depends(get_db)):
     event = db.get(models.Event, event_id)
@@ -70,6 +130,7 @@ def create_selling_point(event_id: str, sp_in: schemas.SellingPointCreate, db: S
         raise HTTPException(status_code=404, detail="Event not found")
     sp = models.SellingPoint(event_id=event_id, **sp_in.dict())
     db.add(sp)
+    versions.bump(db, event_id)
     db.commit()
     db.refresh(sp)
     return sp
@@ -82,6 +143,7 @@ def update_selling_point(event_id: str, sp_id: str, sp_in: schemas.SellingPointU
         raise HTTPException(status_code=404, detail="Selling point not found")
     for field, value in sp_in.dict(exclude_unset=True).items():
         setattr(sp, field, value)
+    versions.bump(db, event_id)
     db.commit()
     db.refresh(sp)
     return sp
@@ -93,14 +155,23 @@ def delete_selling_point(event_id: str, sp_id: str, db: Session = Depends(get_db
     if not sp or sp.event_id != event_id:
         raise HTTPException(status_code=404, detail="Selling point not found")
     db.delete(sp)
+    ledger.forget(db, event_id)
+    versions.bump(db, event_id)
     db.commit()
     return {"ok": True}
 
 
 # EPT CRUD
 @router.get("/selling-points/{sp_id}/epts", response_model=list[schemas.EPTRead])
-def list_epts(sp_id: str, db: Session = Depends(get_db)):
-    return db.query(models.EPT).filter_by(selling_point_id=sp_id).all()
+async def list_epts(
+    sp_id: str,
+    response: Response,
+    cursor: str | None = None,
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    db: QueryRunner = Depends(get_query_runner),
+):
+    stmt = select(models.EPT).where(models.EPT.selling_point_id == sp_id)
+    return await _list_page(db, response, stmt, EPT_ORDER, cursor, limit)
 
 
 @router.post("/selling-points/{sp_id}/epts", response_model=schemas.EPTRead)
@@ -110,6 +181,7 @@ def create_ept(sp_id: str, ept_in: schemas.EPTCreate, db: Session = Depends(get_
         raise HTTPException(status_code=404, detail="Selling point not found")
     ept = models.EPT(selling_point_id=sp_id, **ept_in.dict())
     db.add(ept)
+    versions.bump(db, sp.event_id)
     db.commit()
     db.refresh(ept)
     return ept
@@ -122,6 +194,7 @@ def update_ept(sp_id: str, ept_id: str, ept_in: schemas.EPTUpdate, db: Session =
         raise HTTPException(status_code=404, detail="EPT not found")
     for field, value in ept_in.dict(exclude_unset=True).items():
         setattr(ept, field, value)
+    versions.bump(db, ept.selling_point.event_id)
     db.commit()
     db.refresh(ept)
     return ept
@@ -132,183 +205,474 @@ def delete_ept(sp_id: str, ept_id: str, db: Session = Depends(get_db)):
     ept = db.get(models.EPT, ept_id)
     if not ept or ept.selling_point_id != sp_id:
         raise HTTPException(status_code=404, detail="EPT not found")
+    ledger.forget(db, ept.selling_point.event_id)
+    versions.bump(db, ept.selling_point.event_id)
     db.delete(ept)
     db.commit()
     return {"ok": True}
 
 
 # CSV Import
-@router.post("/{event_id}/imports", response_model=schemas.ImportSummary)
+def _select_parser(parser: str, file_obj) -> tuple[BaseParser, list[str]]:
+    # Only the header line is read; the upload is rewound for the real parse.
+    header = read_header(file_obj)
+    file_obj.seek(0)
+    if parser == "auto":
+        parser_impl = detect_parser(header)
+        if not parser_impl:
+            raise HTTPException(status_code=400, detail="Could not detect a parser for this file")
+        return parser_impl, header
+    parser_impl = PARSER_REGISTRY.get(parser)
+    if not parser_impl:
+        raise HTTPException(status_code=400, detail="Unknown parser")
+    if not parser_impl.sniff(header):
+        raise HTTPException(
+            status_code=400, detail=f"File header does not match parser {parser!r}"
+        )
+    return parser_impl, header
+
+
+@router.post(
+    "/{event_id}/imports",
+    response_model=schemas.ImportSummary | schemas.ImportJobRead | schemas.ImportPreview,
+)
 def import_csv(
     event_id: str,
     parser: str = Form(...),
     file: UploadFile = File(...),
     ept_id: str | None = Form(None),
+    background: bool = Form(False),
+    dry_run: bool = Form(False),
+    sample_rows: int = Form(10, ge=1, le=1000),
     db: Session = Depends(get_db),
 ):
-    parser_impl = PARSER_REGISTRY.get(parser)
-    if not parser_impl:
+    parser_impl, header = _select_parser(parser, file.file)
+    if not db.get(models.Event, event_id):
+        raise HTTPException(status_code=404, detail="Event not found")
+
+    if dry_run:
+        return preview(db, event_id, parser_impl, header, file.file, sample_rows, ept_id)
+
+    # Files already imported into the event are rejected; cumulative exports
+    # only import the rows after the previously imported part.
+    try:
+        if background:
+            job = jobs.submit_import(db, event_id, parser_impl.name, file.file, file.filename, ept_id)
+            return jobs.job_status(job)
+        return import_file(db, event_id, parser_impl, file.file, CHUNK_SIZE, file.filename, ept_id)
+    except ledger.AlreadyImported as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+
+
+@router.post("/{event_id}/imports/bulk", response_model=schemas.BulkImportSummary)
+def import_bulk(
+    event_id: str,
+    files: list[UploadFile] = File(...),
+    parser: str = Form("auto"),
+    ept_id: str | None = Form(None),
+    db: Session = Depends(get_db),
+):
+    # Accepts several CSVs and/or zip archives of CSVs; with parser=auto each
+    # file gets the parser whose sniff() accepts its header.
+    if parser != "auto" and parser not in PARSER_REGISTRY:
         raise HTTPException(status_code=400, detail="Unknown parser")
+    if not db.get(models.Event, event_id):
+        raise HTTPException(status_code=404, detail="Event not found")
 
-    processed = inserted = skipped = errors = 0
-    for tx in parser_impl.parse(file.file):
-        processed += 1
-        sp = (
-            db.query(models.SellingPoint)
-            .filter_by(event_id=event_id, name=tx.selling_point_name)
-            .first()
-        )
-        if not sp:
-            errors += 1
-            continue
-        ept = None
-        if tx.ept_label:
-            ept = (
-                db.query(models.EPT)
-                .filter_by(selling_point_id=sp.id, label=tx.ept_label)
-                .first()
-            )
-        if not ept and ept_id:
-            ept = db.get(models.EPT, ept_id)
-        if not ept:
-            errors += 1
-            continue
-
-        t = models.Transaction(
-            event_id=event_id,
-            selling_point_id=sp.id,
-            ept_id=ept.id,
-            amount_cents=tx.amount_cents,
-            currency=tx.currency,
-            occurred_at=tx.occurred_at,
-            card_last4=tx.card_last4,
-            source=parser,
-            source_row_hash=tx.source_row_hash,
+    os.makedirs(settings.import_dir, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=settings.import_dir) as directory:
+        staged = jobs.stage_uploads(directory, ((f.filename, f.file) for f in files))
+        return import_files(
+            db,
+            event_id,
+            staged,
+            None if parser == "auto" else parser,
+            jobs.parse_pool,
+            ept_id,
         )
-        db.add(t)
-        try:
-            db.commit()
-            inserted += 1
-        except IntegrityError:
-            db.rollback()
-            skipped += 1
-        except Exception:
-            db.rollback()
-            errors += 1
-
-    return schemas.ImportSummary(
-        processed=processed, inserted=inserted, skipped_duplicates=skipped, errors=errors
+
+
+@router.get("/{event_id}/imports/{job_id}", response_model=schemas.ImportJobRead)
+def get_import_job(event_id: str, job_id: str, db: Session = Depends(get_db)):
+    job = db.get(models.ImportJob, job_id)
+    if not job or job.event_id != event_id:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return jobs.job_status(job)
+
+
+def _version_headers(event_id: str, version: int, request: Request) -> dict[str, str]:
+    return {
+        "ETag": versions.etag(event_id, version, request.url.path, request.url.query),
+        "X-Data-Version": str(version),
+    }
+
+
+def _not_modified(request: Request, headers: dict[str, str]) -> bool:
+    tags = request.headers.get("if-none-match", "")
+    return headers["ETag"] in {tag.strip() for tag in tags.split(",")}
+
+
+# Transactions
+def _transaction_conditions(
+    selling_point_id: str | None, ept_id: str | None, from_: datetime | None, to: datetime | None
+) -> list:
+    tx = models.Transaction
+    conditions = []
+    if selling_point_id:
+        conditions.append(tx.selling_point_id == selling_point_id)
+    if ept_id:
+        conditions.append(tx.ept_id == ept_id)
+    if from_:
+        conditions.append(tx.occurred_at >= from_)
+    if to:
+        conditions.append(tx.occurred_at <= to)
+    return conditions
+
+
+def _transactions(db: Session, event_id: str, stmt) -> list | None:
+    if not db.get(models.Event, event_id):
+        return None
+    return db.execute(stmt).all()
+
+
+@router.get("/{event_id}/transactions", response_model=list[schemas.TransactionRead])
+async def list_transactions(
+    event_id: str,
+    selling_point_id: str | None = None,
+    ept_id: str | None = None,
+    from_: datetime | None = Query(None, alias="from"),
+    to: datetime | None = None,
+    fields: str | None = Query(None, description="Comma-separated transaction fields to return"),
+    cursor: str | None = None,
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    db: QueryRunner = Depends(get_read_query_runner),
+):
+    # Pages over (occurred_at, id) on ix_transactions_event_occured; each page
+    # is one index range scan from the cursor, never an OFFSET.
+    selected = [f.strip() for f in fields.split(",")] if fields else list(TRANSACTION_FIELDS)
+    unknown = set(selected) - set(TRANSACTION_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    tx = models.Transaction
+    # The cursor needs the order columns even when they are not returned.
+    columns = dict.fromkeys([*selected, *(column.key for column in TRANSACTION_ORDER)])
+    stmt = select(*(getattr(tx, name) for name in columns)).where(
+        tx.event_id == event_id, *_transaction_conditions(selling_point_id, ept_id, from_, to)
     )
 
+    rows = await db.run(_transactions, event_id, keyset(stmt, TRANSACTION_ORDER, cursor, limit))
+    if rows is None:
+        raise HTTPException(status_code=404, detail="Event not found")
+    rows, next_cursor = page(rows, TRANSACTION_ORDER, limit)
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return FastJSONResponse(
+        [{name: getattr(row, name) for name in selected} for row in rows], headers=headers
+    )
 
-# Summary endpoint
-@router.get("/{event_id}/summary", response_model=schemas.EventSummary)
-def event_summary(event_id: str, db: Session = Depends(get_db)):
-    event = (
-        db.query(models.Event)
-        .options(joinedload(models.Event.selling_points).joinedload(models.SellingPoint.epts))
-        .filter(models.Event.id == event_id)
-        .first()
+
+# Exports
+EXPORT_CONTENT = {"text/csv": {}, "application/gzip": {}, "application/vnd.apache.parquet": {}}
+
+
+def _export_response(
+    filename: str, columns, batches, format: str, compression: str
+) -> StreamingResponse:
+    if format == "parquet":
+        if exports.pa is None:
+            raise HTTPException(status_code=501, detail="Parquet export requires pyarrow")
+        # Parquet compresses column chunks itself; gzip picks that codec rather
+        # than wrapping the file.
+        codec = "gzip" if compression == "gzip" else "snappy"
+        body = exports.parquet_chunks(columns, batches, codec)
+        media_type, filename = "application/vnd.apache.parquet", f"{filename}.parquet"
+    else:
+        body = exports.csv_chunks(columns, batches)
+        media_type, filename = "text/csv; charset=utf-8", f"{filename}.csv"
+        if compression == "gzip":
+            body = exports.gzipped(body)
+            media_type, filename = "application/gzip", f"{filename}.gz"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
     )
+
+
+def _export_name(event: models.Event, kind: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "-", event.name).strip("-") + f"-{kind}"
+
+
+@router.get(
+    "/{event_id}/exports/transactions",
+    response_class=StreamingResponse,
+    responses={200: {"content": EXPORT_CONTENT}},
+)
+async def export_transactions(
+    event_id: str,
+    format: Literal["csv", "parquet"] = "csv",
+    compression: Literal["none", "gzip"] = "none",
+    selling_point_id: str | None = None,
+    ept_id: str | None = None,
+    from_: datetime | None = Query(None, alias="from"),
+    to: datetime | None = None,
+    db: QueryRunner = Depends(get_read_query_runner),
+):
+    event = await db.run(Session.get, models.Event, event_id)
     if not event:
         raise HTTPException(status_code=404, detail="Event not found")
+    batches = exports.transaction_batches(
+        event_id, _transaction_conditions(selling_point_id, ept_id, from_, to)
+    )
+    return _export_response(
+        _export_name(event, "transactions"),
+        exports.TRANSACTION_COLUMNS,
+        batches,
+        format,
+        compression,
+    )
 
-    sp_totals = {
-        sp_id: total
-        for sp_id, total in db.query(
-            models.Transaction.selling_point_id, func.coalesce(func.sum(models.Transaction.amount_cents), 0)
-        )
-        .filter(models.Transaction.event_id == event_id)
-        .group_by(models.Transaction.selling_point_id)
-    }
 
-    ept_totals = {
-        ept_id: total
-        for ept_id, total in db.query(
-            models.Transaction.ept_id, func.coalesce(func.sum(models.Transaction.amount_cents), 0)
-        )
-        .filter(models.Transaction.event_id == event_id)
-        .group_by(models.Transaction.ept_id)
+@router.get(
+    "/{event_id}/exports/summary",
+    response_class=StreamingResponse,
+    responses={200: {"content": EXPORT_CONTENT}},
+)
+async def export_summary(
+    event_id: str,
+    format: Literal["csv", "parquet"] = "csv",
+    compression: Literal["none", "gzip"] = "none",
+    db: QueryRunner = Depends(get_read_query_runner),
+):
+    event = await db.run(Session.get, models.Event, event_id)
+    if not event:
+        raise HTTPException(status_code=404, detail="Event not found")
+    return _export_response(
+        _export_name(event, "summary"),
+        exports.SUMMARY_COLUMNS,
+        exports.summary_batches(event_id),
+        format,
+        compression,
+    )
+
+
+# Summary endpoint
+def _totals_fields(totals: rollups.Totals) -> dict:
+    # int()/float(): SUM() comes back as Decimal on Postgres.
+    return {
+        "total_cents": int(totals.total_cents),
+        "tx_count": int(totals.tx_count),
+        "avg_ticket_cents": float(totals.avg_ticket_cents),
     }
 
+
+def _build_summary(db: Session, event_id: str) -> tuple[int, bytes] | None:
+    # Encoded straight from plain dicts shaped like schemas.EventSummary; the
+    # cache keeps the bytes, so hits need no serialization at all.
+    event = db.get(models.Event, event_id)
+    if not event:
+        return None
+    sps = (
+        db.query(models.SellingPoint)
+        .options(selectinload(models.SellingPoint.epts))
+        .filter_by(event_id=event_id)
+        .all()
+    )
+
+    sp_totals, ept_totals = rollups.totals(db, event_id)
+
+    empty = rollups.Totals()
     selling_points = []
-    for sp in event.selling_points:
-        epts = [
-            schemas.EPTSummary(
-                id=ept.id,
-                label=ept.label,
-                total_cents=ept_totals.get(ept.id, 0),
+    for sp in sps:
+        epts = []
+        for ept in sp.epts:
+            totals = ept_totals.get(ept.id, empty)
+            epts.append(
+                {
+                    "id": ept.id,
+                    "label": ept.label,
+                    **_totals_fields(totals),
+                    "first_at": totals.first_at,
+                    "last_at": totals.last_at,
+                }
             )
-            for ept in sp.epts
-        ]
         selling_points.append(
-            schemas.SellingPointSummary(
-                id=sp.id,
-                name=sp.name,
-                total_cents=sp_totals.get(sp.id, 0),
-                epts=epts,
-            )
+            {
+                "id": sp.id,
+                "name": sp.name,
+                **_totals_fields(sp_totals.get(sp.id, empty)),
+                "epts": epts,
+            }
         )
 
-    return schemas.EventSummary(event_id=event.id, selling_points=selling_points)
+    return event.data_version, fastjson.dumps(
+        {"event_id": event.id, "selling_points": selling_points}
+    )
+
+
+def _data_version(db: Session, event_id: str) -> int | None:
+    return db.scalar(select(models.Event.data_version).where(models.Event.id == event_id))
+
+
+async def _cache_call(fn, *args):
+    # Redis round trips stay off the event loop; local lookups run inline.
+    if summary_cache.shared:
+        return await run_in_threadpool(fn, *args)
+    return fn(*args)
+
+
+@router.get("/{event_id}/summary", response_model=schemas.EventSummary)
+async def event_summary(
+    event_id: str,
+    request: Request,
+    db: QueryRunner = Depends(get_query_runner),
+    read_db: QueryRunner = Depends(get_read_query_runner),
+):
+    # One primary-key lookup on the primary validates cached entries against
+    # writes made by other processes.
+    current = await db.run(_data_version, event_id)
+    if current is None:
+        raise HTTPException(status_code=404, detail="Event not found")
+    cached = await _cache_call(summary_cache.get, event_id, current)
+    if cached is None:
+        generation = summary_cache.generation(event_id)
+        cached = await read_db.run(_build_summary, event_id)
+        if cached is None or cached[0] < current:
+            # The replica lags behind the primary; a summary built there would
+            # be cached and served until the next change.
+            cached = await db.run(_build_summary, event_id)
+        if cached is None:
+            raise HTTPException(status_code=404, detail="Event not found")
+        await _cache_call(summary_cache.set, event_id, *cached, generation)
+    version, body = cached
+
+    headers = _version_headers(event_id, version, request)
+    if _not_modified(request, headers):
+        return Response(status_code=304, headers=headers)
+    return FastJSONResponse(body, headers=headers)
+
+
+# Live totals stream
+def _stream_snapshot(event_id: str) -> dict | None:
+    db = SessionLocal()
+    try:
+        event = db.get(models.Event, event_id)
+        if not event:
+            return None
+        sp_totals, ept_totals = rollups.totals(db, event_id)
+        return {
+            "type": "snapshot",
+            "version": event.data_version,
+            "selling_points": {sp_id: t.total_cents for sp_id, t in sp_totals.items()},
+            "epts": {ept_id: t.total_cents for ept_id, t in ept_totals.items()},
+        }
+    finally:
+        db.close()
+
+
+@router.get("/{event_id}/stream")
+async def event_stream(event_id: str, request: Request):
+    # Subscribe before taking the snapshot so no committed import is missed;
+    # clients drop "totals" messages whose version is <= the snapshot's.
+    queue = publisher.subscribe(event_id)
+    snapshot = await run_in_threadpool(_stream_snapshot, event_id)
+    if snapshot is None:
+        publisher.unsubscribe(event_id, queue)
+        raise HTTPException(status_code=404, detail="Event not found")
+
+    async def messages():
+        try:
+            yield f"event: snapshot\ndata: {json.dumps(snapshot)}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    payload = await asyncio.wait_for(queue.get(), STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                kind = json.loads(payload).get("type", "totals")
+                yield f"event: {kind}\ndata: {payload}\n\n"
+        finally:
+            publisher.unsubscribe(event_id, queue)
+
+    return StreamingResponse(
+        messages(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 # Timeline endpoint
-@router.get("/{event_id}/timeline", response_model=schemas.EventTimeline)
-def event_timeline(event_id: str, bucket: str = "5m", db: Session = Depends(get_db)):
-    event = db.get(models.Event, event_id)
+@router.get(
+    "/{event_id}/timeline",
+    response_model=schemas.EventTimeline | schemas.EventTimelineColumnar,
+    responses={200: {"content": {"application/octet-stream": {}}}},
+)
+async def event_timeline(
+    event_id: str,
+    request: Request,
+    bucket: str = "5m",
+    format: Literal["json", "columnar", "binary"] = "json",
+    max_points: int = Query(timeline.DEFAULT_MAX_POINTS, ge=2, le=100_000),
+    from_: datetime | None = Query(None, alias="from"),
+    to: datetime | None = None,
+    since: int | None = Query(None, ge=0),
+    db: QueryRunner = Depends(get_read_query_runner),
+):
+    event = await db.run(Session.get, models.Event, event_id)
     if not event:
         raise HTTPException(status_code=404, detail="Event not found")
+    headers = _version_headers(event_id, event.data_version, request)
+    if _not_modified(request, headers):
+        return Response(status_code=304, headers=headers)
 
-    if not bucket[:-1].isdigit() or bucket[-1] not in {"s", "m", "h"}:
+    try:
+        delta = timeline.parse_bucket(bucket)
+    except ValueError:
         raise HTTPException(status_code=400, detail="Invalid bucket")
-    value = int(bucket[:-1])
-    if bucket[-1] == "s":
-        delta = timedelta(seconds=value)
-    elif bucket[-1] == "m":
-        delta = timedelta(minutes=value)
-    else:
-        delta = timedelta(hours=value)
-
-    buckets: list[datetime] = []
-    current = event.start_at
-    while current <= event.end_at:
-        buckets.append(current)
-        current += delta
-
-    sps = db.query(models.SellingPoint).filter_by(event_id=event_id).all()
-    txs = (
-        db.query(models.Transaction)
-        .filter(models.Transaction.event_id == event_id)
-        .order_by(models.Transaction.selling_point_id, models.Transaction.occurred_at)
-        .all()
-    )
-    sp_tx: dict[str, list[models.Transaction]] = defaultdict(list)
-    for t in txs:
-        sp_tx[t.selling_point_id].append(t)
 
-    series: list[schemas.TimelineSeries] = []
-    for sp in sps:
-        tx_list = sp_tx.get(sp.id, [])
-        cum: list[int] = []
-        running = 0
-        idx = 0
-        for bucket_time in buckets:
-            while idx < len(tx_list) and tx_list[idx].occurred_at <= bucket_time:
-                running += tx_list[idx].amount_cents
-                idx += 1
-            cum.append(running)
-        series.append(
-            schemas.TimelineSeries(
-                selling_point_id=sp.id,
-                lat=sp.latitude,
-                lng=sp.longitude,
-                cumulative=cum,
+    start = from_ or event.start_at
+    end = to or event.end_at
+    if (from_ or to) and end < start:
+        raise HTTPException(status_code=400, detail="'to' must not be before 'from'")
+    delta, count = timeline.plan_buckets(start, end, delta, max_points)
+    if since is not None:
+        # Only buckets at or after the earliest changed transaction can differ
+        # from what a client at version `since` already has.
+        everything, changed_from = await db.run(versions.changed_since, event, since)
+        if not everything:
+            skip = count if changed_from is None else -((start - changed_from) // delta)
+            skip = min(count, max(0, skip))
+            start += delta * skip
+            count -= skip
+    buckets = [start + delta * i for i in range(count)]
+
+    sps = await db.run(_selling_points, event_id)
+    cumulative = await db.run(timeline.cumulative_series, event_id, start, delta, count)
+    if format != "json":
+        columnar = timeline.to_columnar(event, start, delta, count, sps, cumulative)
+        if format == "binary":
+            return Response(
+                timeline.pack_columnar(columnar),
+                media_type="application/octet-stream",
+                headers=headers,
             )
-        )
-
-    return schemas.EventTimeline(
-        event=schemas.TimelineEvent(start_at=event.start_at, end_at=event.end_at),
-        buckets=buckets,
-        series=series,
+        return FastJSONResponse(columnar, headers=headers)
+
+    # Plain dicts shaped like schemas.EventTimeline.
+    series = [
+        {
+            "selling_point_id": sp.id,
+            "lat": sp.latitude,
+            "lng": sp.longitude,
+            "cumulative": cumulative.get(sp.id, [0] * count),
+        }
+        for sp in sps
+    ]
+    return FastJSONResponse(
+        {
+            "event": {"start_at": event.start_at, "end_at": event.end_at},
+            "bucket": timeline.format_bucket(delta),
+            "buckets": buckets,
+            "series": series,
+        },
+        headers=headers,
     )
@@ -3,7 +3,7 @@ from typing import List, Optional
 
 from pydantic import BaseModel
 
-from models import EPTProvider
+from models import EPTProvider, ImportJobStatus
 
 
 # Event
@@ -86,7 +86,22 @@ class TransactionIn(BaseModel):
     currency: str
     occurred_at: datetime
     card_last4: str
-    source_row_hash: str
+    source_row_hash: bytes
+
+    class Config:
+        ser_json_bytes = "hex"
+
+
+class TransactionRead(BaseModel):
+    # All optional: ?fields= returns only the selected keys.
+    id: Optional[str] = None
+    selling_point_id: Optional[str] = None
+    ept_id: Optional[str] = None
+    amount_cents: Optional[int] = None
+    currency: Optional[str] = None
+    occurred_at: Optional[datetime] = None
+    card_last4: Optional[str] = None
+    source: Optional[str] = None
 
 
 class ImportSummary(BaseModel):
@@ -96,17 +111,55 @@ class ImportSummary(BaseModel):
     errors: int
 
 
+class FileImportSummary(ImportSummary):
+    filename: Optional[str] = None
+    parser: Optional[str] = None
+    error_message: Optional[str] = None
+
+
+class BulkImportSummary(ImportSummary):
+    files: List[FileImportSummary]
+
+
+class ImportPreview(BaseModel):
+    parser: str
+    header: List[str]
+    rows: List[TransactionIn]
+    # Sample rows whose selling point/EPT does not exist in the event.
+    unresolved: int = 0
+    error_message: Optional[str] = None
+
+
+class ImportJobRead(ImportSummary):
+    id: str
+    event_id: str
+    parser: str
+    filename: Optional[str] = None
+    status: ImportJobStatus
+    error_message: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    rows_per_second: float
+
+
 # Summary schemas
 class EPTSummary(BaseModel):
     id: str
     label: str
     total_cents: int
+    tx_count: int = 0
+    avg_ticket_cents: float = 0.0
+    first_at: Optional[datetime] = None
+    last_at: Optional[datetime] = None
 
 
 class SellingPointSummary(BaseModel):
     id: str
     name: str
     total_cents: int
+    tx_count: int = 0
+    avg_ticket_cents: float = 0.0
     epts: List[EPTSummary]
 
 
@@ -130,5 +183,25 @@ class TimelineEvent(BaseModel):
 
 class EventTimeline(BaseModel):
     event: TimelineEvent
+    bucket: Optional[str] = None
     buckets: List[datetime]
     series: List[TimelineSeries]
+
+
+# Columnar timeline: buckets are start + i * step_seconds for i < count, and each
+# series sends its first cumulative value plus the per-bucket increments after it.
+class TimelineColumnSeries(BaseModel):
+    selling_point_id: str
+    lat: float
+    lng: float
+    base: int
+    deltas: List[int]
+
+
+class EventTimelineColumnar(BaseModel):
+    event: TimelineEvent
+    bucket: str
+    start: datetime
+    step_seconds: int
+    count: int
+    series: List[TimelineColumnSeries]
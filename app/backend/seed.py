@@ -1,5 +1,6 @@
 from datetime import datetime, timedelta
 
+import partitions
 from db import SessionLocal
 from models import Event, SellingPoint, EPT, EPTProvider
 
@@ -13,6 +14,7 @@ def run() -> None:
     )
     db.add(event)
     db.flush()
+    partitions.create(db, event.id)
 
     sp1 = SellingPoint(event_id=event.id, name="Bar", latitude=46.52, longitude=6.57)
     sp2 = SellingPoint(event_id=event.id, name="Merch", latitude=46.53, longitude=6.58)
@@ -0,0 +1,176 @@
+import asyncio
+import json
+import logging
+import select
+import threading
+from collections import defaultdict
+from typing import Callable, Protocol
+
+from sqlalchemy import text
+
+from db import engine, settings
+
+logger = logging.getLogger(__name__)
+
+Deliver = Callable[[str, str], None]
+
+
+class StreamBackend(Protocol):
+    def start(self, deliver: Deliver) -> None:
+        ...
+
+    def publish(self, channel: str, payload: str) -> None:
+        ...
+
+    def stop(self) -> None:
+        ...
+
+
+class LocalBackend:
+    # Single API worker: messages go straight to this process' subscribers.
+    def start(self, deliver: Deliver) -> None:
+        self._deliver = deliver
+
+    def publish(self, channel: str, payload: str) -> None:
+        self._deliver(channel, payload)
+
+    def stop(self) -> None:
+        pass
+
+
+class PostgresBackend:
+    # Several API workers: messages are fanned out through LISTEN/NOTIFY so every
+    # worker's subscribers see imports committed by any other worker.
+    pg_channel = "event_stream"
+    max_payload = 7900
+
+    def start(self, deliver: Deliver) -> None:
+        self._deliver = deliver
+        self._stopped = threading.Event()
+        self._listening = threading.Event()
+        self._thread = threading.Thread(target=self._listen, name="stream-listen", daemon=True)
+        self._thread.start()
+        self._listening.wait(timeout=5)
+
+    def publish(self, channel: str, payload: str) -> None:
+        message = json.dumps({"channel": channel, "payload": payload})
+        if len(message.encode()) > self.max_payload:
+            message = json.dumps({"channel": channel, "payload": _refresh(payload)})
+        with engine.begin() as conn:
+            conn.execute(
+                text("SELECT pg_notify(:channel, :message)"),
+                {"channel": self.pg_channel, "message": message},
+            )
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def _listen(self) -> None:
+        raw = engine.raw_connection()
+        conn = raw.driver_connection
+        # Keep this connection out of the pool for the lifetime of the listener.
+        raw.detach()
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute(f"LISTEN {self.pg_channel}")
+        self._listening.set()
+        try:
+            while not self._stopped.is_set():
+                if select.select([conn], [], [], 1.0) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    message = json.loads(conn.notifies.pop(0).payload)
+                    self._deliver(message["channel"], message["payload"])
+        finally:
+            conn.close()
+
+
+class Publisher:
+    queue_size = 100
+
+    def __init__(self, backend: StreamBackend):
+        self.backend = backend
+        self._subscribers: dict[str, set[tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = (
+            defaultdict(set)
+        )
+        self._listeners: dict[str, list[Callable[[dict], None]]] = defaultdict(list)
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self) -> None:
+        if not self._started:
+            self.backend.start(self._deliver)
+            self._started = True
+
+    def stop(self) -> None:
+        if self._started:
+            self.backend.stop()
+            self._started = False
+
+    def subscribe(self, channel: str) -> asyncio.Queue:
+        self.start()
+        queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        with self._lock:
+            self._subscribers[channel].add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def add_listener(self, channel: str, callback: Callable[[dict], None]) -> None:
+        # Synchronous in-process consumers, called on the delivering thread.
+        with self._lock:
+            self._listeners[channel].append(callback)
+
+    def unsubscribe(self, channel: str, queue: asyncio.Queue) -> None:
+        with self._lock:
+            self._subscribers[channel] = {
+                entry for entry in self._subscribers[channel] if entry[1] is not queue
+            }
+            if not self._subscribers[channel]:
+                del self._subscribers[channel]
+
+    def publish(self, channel: str, message: dict) -> None:
+        self.start()
+        try:
+            self.backend.publish(channel, json.dumps(message))
+        except Exception:
+            logger.exception("Failed to publish stream message for %s", channel)
+
+    def _deliver(self, channel: str, payload: str) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+            listeners = list(self._listeners.get(channel, ()))
+        for callback in listeners:
+            try:
+                callback(json.loads(payload))
+            except Exception:
+                logger.exception("Stream listener failed for %s", channel)
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, payload)
+            except RuntimeError:
+                # The subscriber's event loop has already shut down.
+                self.unsubscribe(channel, queue)
+
+
+def _refresh(payload: str) -> str:
+    # Tells clients to refetch instead of applying a delta they cannot get.
+    return json.dumps({"type": "refresh", "version": json.loads(payload).get("version")})
+
+
+def _offer(queue: asyncio.Queue, payload: str) -> None:
+    # Slow consumers do not stall imports: when their queue is full, the pending
+    # deltas are replaced by a refresh, since totals missing one delta would
+    # stay wrong.
+    if queue.full():
+        while not queue.empty():
+            queue.get_nowait()
+        payload = _refresh(payload)
+    queue.put_nowait(payload)
+
+
+BACKENDS: dict[str, Callable[[], StreamBackend]] = {
+    "local": LocalBackend,
+    "postgres": PostgresBackend,
+}
+
+publisher = Publisher(BACKENDS[settings.stream_backend]())
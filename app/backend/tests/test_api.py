@@ -1,4 +1,14 @@
 from datetime import datetime, timedelta
+import asyncio
+import hashlib
+import io
+import json
+import os
+import struct
+import time
+import zipfile
+
+import pytest
 
 import sys
 from pathlib import Path
@@ -8,8 +18,11 @@ sys.path.append(str(Path(__file__).resolve().parents[2]))
 from fastapi.testclient import TestClient
 
 from backend.main import app
-from backend.db import Base, engine
-from backend.parsers import PARSER_REGISTRY
+import dedup, importer, jobs, ledger, metrics, models, partitions, rollups, schemas
+from db import Base, SessionLocal, engine, settings
+import parsers
+from parsers import PARSER_REGISTRY
+from stream import publisher
 
 client = TestClient(app)
 
@@ -93,15 +106,47 @@ def test_csv_import():
     data = r.json()
     assert data == {"processed": 2, "inserted": 2, "skipped_duplicates": 0, "errors": 0}
 
-    # Re-upload should skip duplicates
+    # Re-uploading the same file is rejected by the import ledger
     with sample.open("rb") as f:
         r = client.post(
             f"/events/{event_id}/imports",
             data={"parser": "mock_worldline"},
             files={"file": ("worldline_mock.csv", f, "text/csv")},
         )
-    data = r.json()
-    assert data == {"processed": 2, "inserted": 0, "skipped_duplicates": 2, "errors": 0}
+    assert r.status_code == 409
+
+
+def test_duplicates_are_per_event():
+    sample = Path(__file__).resolve().parents[1] / "samples" / "worldline_mock.csv"
+    for name in ("Season 1", "Season 2"):
+        payload = {
+            "name": name,
+            "start_at": datetime.utcnow().isoformat(),
+            "end_at": (datetime.utcnow() + timedelta(hours=1)).isoformat(),
+        }
+        event_id = client.post("/events/", json=payload).json()["id"]
+        sp_payload = {"name": "Gate A", "latitude": 0.0, "longitude": 0.0}
+        sp_id = client.post(f"/events/{event_id}/selling-points", json=sp_payload).json()["id"]
+        client.post(
+            f"/events/selling-points/{sp_id}/epts",
+            json={"provider": "worldline", "label": "Terminal 1"},
+        )
+        with sample.open("rb") as f:
+            r = client.post(
+                f"/events/{event_id}/imports",
+                data={"parser": "mock_worldline"},
+                files={"file": ("worldline_mock.csv", f, "text/csv")},
+            )
+        assert r.json()["inserted"] == 2
+
+    # Partition management is a no-op on SQLite's plain table.
+    db = SessionLocal()
+    try:
+        partitions.detach(db, event_id)
+        partitions.attach(db, event_id)
+    finally:
+        db.close()
+    assert client.get(f"/events/{event_id}/summary").json()["selling_points"][0]["total_cents"] > 0
 
 
 def test_timeline_endpoint():
@@ -141,3 +186,1109 @@ def test_timeline_endpoint():
     assert data["buckets"][0].startswith("2024-01-01T09:00:00")
     series = data["series"][0]
     assert series["cumulative"] == [0, 1000, 3000, 3000]
+
+
+def test_csv_import_batches_duplicates_and_errors():
+    payload = {
+        "name": "Batch Import Event",
+        "start_at": datetime(2024, 2, 1, 9).isoformat(),
+        "end_at": datetime(2024, 2, 1, 12).isoformat(),
+    }
+    event_id = client.post("/events/", json=payload).json()["id"]
+    sp_payload = {"name": "Bar", "latitude": 0.0, "longitude": 0.0}
+    sp_id = client.post(f"/events/{event_id}/selling-points", json=sp_payload).json()["id"]
+    client.post(f"/events/selling-points/{sp_id}/epts", json={"provider": "sumup", "label": "SU-1"})
+
+    csv_body = (
+        "selling_point,ept,amount_cents,currency,occurred_at,card_last4\n"
+        "Bar,SU-1,150,CHF,2024-02-01T10:00:00,1111\n"
+        "Bar,SU-1,150,CHF,2024-02-01T10:00:00,1111\n"
+        "Unknown,SU-1,300,CHF,2024-02-01T10:05:00,2222\n"
+        "Bar,SU-1,450,CHF,2024-02-01T10:10:00,3333\n"
+    ).encode()
+    r = client.post(
+        f"/events/{event_id}/imports",
+        data={"parser": "mock_worldline"},
+        files={"file": ("batch.csv", io.BytesIO(csv_body), "text/csv")},
+    )
+    assert r.json() == {"processed": 4, "inserted": 2, "skipped_duplicates": 1, "errors": 1}
+
+    r = client.get(f"/events/{event_id}/summary")
+    assert r.json()["selling_points"][0]["total_cents"] == 600
+
+
+def test_auto_parser_and_dry_run():
+    payload = {
+        "name": "Auto Parser Event",
+        "start_at": datetime(2024, 2, 3, 9).isoformat(),
+        "end_at": datetime(2024, 2, 3, 12).isoformat(),
+    }
+    event_id = client.post("/events/", json=payload).json()["id"]
+    sp_payload = {"name": "Bar", "latitude": 0.0, "longitude": 0.0}
+    sp_id = client.post(f"/events/{event_id}/selling-points", json=sp_payload).json()["id"]
+    client.post(f"/events/selling-points/{sp_id}/epts", json={"provider": "sumup", "label": "SU-1"})
+
+    csv_body = (
+        "selling_point,ept,amount_cents,currency,occurred_at,card_last4\n"
+        "Bar,SU-1,150,CHF,2024-02-03T10:00:00,1111\n"
+        "Tent,SU-1,250,CHF,2024-02-03T10:05:00,2222\n"
+        "Bar,SU-1,oops,CHF,2024-02-03T10:10:00,3333\n"
+    ).encode()
+    r = client.post(
+        f"/events/{event_id}/imports",
+        data={"parser": "auto", "dry_run": "true", "sample_rows": "5"},
+        files={"file": ("auto.csv", io.BytesIO(csv_body), "text/csv")},
+    )
+    assert r.status_code == 200
+    data = r.json()
+    assert data["parser"] == "mock_worldline"
+    assert [row["amount_cents"] for row in data["rows"]] == [150, 250]
+    assert data["unresolved"] == 1
+    assert data["error_message"].startswith("Row 3")
+    assert client.get(f"/events/{event_id}/summary").json()["selling_points"][0]["total_cents"] == 0
+
+    r = client.post(
+        f"/events/{event_id}/imports",
+        data={"parser": "auto"},
+        files={"file": ("auto.csv", io.BytesIO(csv_body[: csv_body.rindex(b"Bar,")]), "text/csv")},
+    )
+    assert r.json() == {"processed": 2, "inserted": 1, "skipped_duplicates": 0, "errors": 1}
+
+    for parser in ("auto", "mock_worldline"):
+        r = client.post(
+            f"/events/{event_id}/imports",
+            data={"parser": parser},
+            files={"file": ("other.csv", io.BytesIO(b"date,total\n2024-02-03,10\n"), "text/csv")},
+        )
+        assert r.status_code == 400
+
+
+def test_summary_counts_averages_and_bounds():
+    payload = {
+        "name": "Summary Stats Event",
+        "start_at": datetime(2024, 2, 2, 9).isoformat(),
+        "end_at": datetime(2024, 2, 2, 12).isoformat(),
+    }
+    event_id = client.post("/events/", json=payload).json()["id"]
+    sp_payload = {"name": "Kiosk", "latitude": 0.0, "longitude": 0.0}
+    sp_id = client.post(f"/events/{event_id}/selling-points", json=sp_payload).json()["id"]
+    for label in ("K-1", "K-2"):
+        client.post(f"/events/selling-points/{sp_id}/epts", json={"provider": "sumup", "label": label})
+
+    header = "selling_point,ept,amount_cents,currency,occurred_at,card_last4\n"
+    batches = [
+        "Kiosk,K-1,100,CHF,2024-02-02T10:00:20,0001\nKiosk,K-2,900,CHF,2024-02-02T11:00:00,0002\n",
+        # Lands in the same rollup bucket as the first row of the previous file.
+        "Kiosk,K-1,200,CHF,2024-02-02T10:00:10,0003\nKiosk,K-1,600,CHF,2024-02-02T10:00:50,0004\n",
+    ]
+    for i, rows in enumerate(batches):
+        client.post(
+            f"/events/{event_id}/imports",
+            data={"parser": "mock_worldline"},
+            files={"file": (f"stats-{i}.csv", io.BytesIO((header + rows).encode()), "text/csv")},
+        )
+
+    sp = client.get(f"/events/{event_id}/summary").json()["selling_points"][0]
+    assert (sp["total_cents"], sp["tx_count"], sp["avg_ticket_cents"]) == (1800, 4, 450)
+    k1, k2 = sorted(sp["epts"], key=lambda e: e["label"])
+    assert (k1["total_cents"], k1["tx_count"], k1["avg_ticket_cents"]) == (900, 3, 300)
+    assert k1["first_at"].startswith("2024-02-02T10:00:10")
+    assert k1["last_at"].startswith("2024-02-02T10:00:50")
+    assert k2["first_at"] == k2["last_at"]
+
+
+def test_row_keys_and_known_keys():
+    keys = [parsers.row_key("Bar", "WL-1", str(i)) for i in range(1000)]
+    assert all(len(key) == 16 for key in keys)
+    assert len(set(keys)) == len(keys)
+    known = dedup.KnownKeys()
+    assert known.duplicates([keys[0], keys[1], keys[0]]) == [False, False, True]
+    assert known.duplicates([]) == []
+    known.add(keys[:2])
+    assert known.duplicates([keys[1], keys[2]]) == [True, False]
+
+
+def test_mock_parser_chunks():
+    parser = PARSER_REGISTRY["mock_worldline"]
+    sample = Path(__file__).resolve().parents[1] / "samples" / "worldline_mock.csv"
+    with sample.open("rb") as f:
+        chunks = list(parser.parse(f, chunk_size=1))
+        assert not f.closed
+    assert [len(c) for c in chunks] == [1, 1]
+    assert chunks[1][0].amount_cents == 2000
+
+
+def test_columnar_parser_matches_row_parser(monkeypatch):
+    parser = PARSER_REGISTRY["mock_worldline"]
+    csv_body = "selling_point,ept,amount_cents,currency,occurred_at,card_last4\n" + "".join(
+        f"Bar,WL-{i % 3},{100 + i},CHF,2024-05-01T10:{i % 60:02d}:00,{i:04d}\n" for i in range(7)
+    )
+    expected = [
+        (tx.selling_point_name, tx.ept_label, tx.amount_cents, tx.currency, tx.occurred_at,
+         tx.card_last4, tx.source_row_hash)
+        for tx in parser.parse(io.BytesIO(csv_body.encode()))
+    ]
+    for arrow in (parsers.pa, None):
+        monkeypatch.setattr(parsers, "pa", arrow)
+        chunks = list(parser.parse_columns(io.BytesIO(csv_body.encode()), chunk_size=3))
+        assert [len(c) for c in chunks] == [3, 3, 1]
+        assert [row for c in chunks for row in c.rows()] == expected
+
+
+def test_background_import_job(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "import_dir", str(tmp_path))
+    payload = {
+        "name": "Background Import Event",
+        "start_at": datetime(2024, 3, 1, 9).isoformat(),
+        "end_at": datetime(2024, 3, 1, 12).isoformat(),
+    }
+    event_id = client.post("/events/", json=payload).json()["id"]
+    sp_payload = {"name": "Food", "latitude": 0.0, "longitude": 0.0}
+    sp_id = client.post(f"/events/{event_id}/selling-points", json=sp_payload).json()["id"]
+    client.post(f"/events/selling-points/{sp_id}/epts", json={"provider": "worldline", "label": "WL-9"})
+
+    csv_body = (
+        "selling_point,ept,amount_cents,currency,occurred_at,card_last4\n"
+        "Food,WL-9,700,CHF,2024-03-01T10:00:00,4444\n"
+        "Food,WL-9,800,CHF,2024-03-01T10:30:00,5555\n"
+    ).encode()
+    r = client.post(
+        f"/events/{event_id}/imports",
+        data={"parser": "mock_worldline", "background": "true"},
+        files={"file": ("bg.csv", io.BytesIO(csv_body), "text/csv")},
+    )
+    assert r.status_code == 200
+    job_id = r.json()["id"]
+
+    for _ in range(50):
+        job = client.get(f"/events/{event_id}/imports/{job_id}").json()
+        if job["status"] in ("succeeded", "failed"):
+            break
+        time.sleep(0.1)
+    assert job["status"] == "succeeded"
+    assert (job["processed"], job["inserted"], job["skipped_duplicates"], job["errors"]) == (2, 2, 0, 0)
+    assert job["rows_per_second"] >= 0
+
+    # A job interrupted after committing its first row resumes from the import
+    # ledger and keeps the counters of the part committed before.
+    header = csv_body.decode().splitlines(keepends=True)[0]
+    rows = [
+        f"Food,WL-9,{amount},CHF,2024-03-01T11:0{i}:00,666{i}\n"
+        for i, amount in enumerate((100, 200, 300))
+    ]
+    body = (header + "".join(rows)).encode()
+    path = os.path.join(settings.import_dir, "resumed.upload")
+    with open(path, "wb") as out:
+        out.write(body)
+    db = SessionLocal()
+    tracked = ledger.TrackedImport(db, event_id, io.BytesIO(body), "resumed.csv")
+    tracked.entry.committed_offset = len(header) + len(rows[0])
+    tracked.entry.prefix_hash = hashlib.sha256(body[: tracked.entry.committed_offset]).hexdigest()
+    tracked.entry.processed = tracked.entry.inserted = 1
+    job = models.ImportJob(
+        event_id=event_id,
+        parser="mock_worldline",
+        filename="resumed.csv",
+        file_path=path,
+        file_hash=hashlib.sha256(body).hexdigest(),
+        status=models.ImportJobStatus.running,
+    )
+    db.add(job)
+    db.commit()
+    job_id = job.id
+    db.close()
+    jobs.run_import_job(job_id)
+    job = client.get(f"/events/{event_id}/imports/{job_id}").json()
+    assert job["status"] == "succeeded"
+    assert (job["processed"], job["inserted"], job["skipped_duplicates"]) == (3, 3, 0)
+    r = client.get(f"/events/{event_id}/summary")
+    assert r.json()["selling_points"][0]["total_cents"] == 1500 + 200 + 300
+
+
+def test_bulk_import_zip_and_files(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "import_dir", str(tmp_path))
+    payload = {
+        "name": "Bulk Import Event",
+        "start_at": datetime(2024, 3, 2, 9).isoformat(),
+        "end_at": datetime(2024, 3, 2, 12).isoformat(),
+    }
+    event_id = client.post("/events/", json=payload).json()["id"]
+    sp_payload = {"name": "Bar", "latitude": 0.0, "longitude": 0.0}
+    sp_id = client.post(f"/events/{event_id}/selling-points", json=sp_payload).json()["id"]
+    client.post(f"/events/selling-points/{sp_id}/epts", json={"provider": "worldline", "label": "WL-1"})
+
+    header = "selling_point,ept,amount_cents,currency,occurred_at,card_last4\n"
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("t1.csv", header + "Bar,WL-1,100,CHF,2024-03-02T10:00:00,1111\n")
+        zf.writestr("t2.csv", header + "Bar,WL-1,200,CHF,2024-03-02T10:05:00,2222\n")
+    plain = header + "Bar,WL-1,300,CHF,2024-03-02T10:10:00,3333\n" + "Bar,WL-1,100,CHF,2024-03-02T10:00:00,1111\n"
+    r = client.post(
+        f"/events/{event_id}/imports/bulk",
+        files=[
+            ("files", ("terminals.zip", archive.getvalue(), "application/zip")),
+            ("files", ("t3.csv", plain.encode(), "text/csv")),
+            ("files", ("notes.csv", b"foo,bar\n1,2\n", "text/csv")),
+        ],
+    )
+    assert r.status_code == 200
+    data = r.json()
+    assert (data["processed"], data["inserted"], data["skipped_duplicates"]) == (4, 3, 1)
+    assert [f["filename"] for f in data["files"]] == ["t1.csv", "t2.csv", "t3.csv", "notes.csv"]
+    assert data["files"][0]["parser"] == "mock_worldline"
+    assert data["files"][3]["parser"] is None and data["files"][3]["error_message"]
+
+    # An explicit parser still has to accept each file's header.
+    r = client.post(
+        f"/events/{event_id}/imports/bulk",
+        data={"parser": "mock_worldline"},
+        files=[("files", ("other.csv", b"foo,bar\n3,4\n", "text/csv"))],
+    )
+    assert "does not match" in r.json()["files"][0]["error_message"]
+
+    r = client.get(f"/events/{event_id}/summary")
+    assert r.json()["selling_points"][0]["total_cents"] == 600
+
+
+def test_timeline_rollup_matches_raw_and_rebuild():
+    start = datetime(2024, 4, 1, 9, 0, 0)
+    payload = {
+        "name": "Rollup Event",
+        "start_at": start.isoformat(),
+        "end_at": (start + timedelta(hours=2)).isoformat(),
+    }
+    event_id = client.post("/events/", json=payload).json()["id"]
+    sp_payload = {"name": "Stage", "latitude": 1.0, "longitude": 2.0}
+    sp_id = client.post(f"/events/{event_id}/selling-points", json=sp_payload).json()["id"]
+    client.post(f"/events/selling-points/{sp_id}/epts", json={"provider": "other", "label": "OT-1"})
+
+    csv_body = (
+        "selling_point,ept,amount_cents,currency,occurred_at,card_last4\n"
+        "Stage,OT-1,100,CHF,2024-04-01T09:00:00,0001\n"
+        "Stage,OT-1,200,CHF,2024-04-01T09:00:30,0002\n"
+        "Stage,OT-1,400,CHF,2024-04-01T09:59:59,0003\n"
+        "Stage,OT-1,800,CHF,2024-04-01T10:00:00.500000,0004\n"
+    ).encode()
+    client.post(
+        f"/events/{event_id}/imports",
+        data={"parser": "mock_worldline"},
+        files={"file": ("rollup.csv", io.BytesIO(csv_body), "text/csv")},
+    )
+
+    # 1m buckets are served from rollups, 30s buckets from raw transactions.
+    minutes = client.get(f"/events/{event_id}/timeline", params={"bucket": "1m"}).json()
+    seconds = client.get(f"/events/{event_id}/timeline", params={"bucket": "30s"}).json()
+    assert minutes["series"][0]["cumulative"] == seconds["series"][0]["cumulative"][::2]
+    assert minutes["series"][0]["cumulative"][:2] == [100, 300]
+    assert minutes["series"][0]["cumulative"][60] == 700
+    assert minutes["series"][0]["cumulative"][61] == 1500
+
+    db = SessionLocal()
+    db.query(models.TransactionRollup).filter_by(event_id=event_id).delete()
+    db.commit()
+    assert client.get(f"/events/{event_id}/summary").json()["selling_points"][0]["total_cents"] == 0
+    rollups.rebuild(db, event_id)
+    db.close()
+    summary = client.get(f"/events/{event_id}/summary").json()
+    assert summary["selling_points"][0]["total_cents"] == 1500
+    assert summary["selling_points"][0]["epts"][0]["total_cents"] == 1500
+
+
+def test_timeline_max_points_and_window():
+    start = datetime(2024, 5, 1, 0, 0, 0)
+    payload = {
+        "name": "Long Event",
+        "start_at": start.isoformat(),
+        "end_at": (start + timedelta(days=3)).isoformat(),
+    }
+    event_id = client.post("/events/", json=payload).json()["id"]
+    sp_payload = {"name": "Camping", "latitude": 0.0, "longitude": 0.0}
+    sp_id = client.post(f"/events/{event_id}/selling-points", json=sp_payload).json()["id"]
+    client.post(f"/events/selling-points/{sp_id}/epts", json={"provider": "sumup", "label": "SU-7"})
+    csv_body = (
+        "selling_point,ept,amount_cents,currency,occurred_at,card_last4\n"
+        "Camping,SU-7,100,CHF,2024-05-01T12:00:05,9001\n"
+        "Camping,SU-7,200,CHF,2024-05-02T12:00:10,9002\n"
+    ).encode()
+    client.post(
+        f"/events/{event_id}/imports",
+        data={"parser": "mock_worldline"},
+        files={"file": ("long.csv", io.BytesIO(csv_body), "text/csv")},
+    )
+
+    r = client.get(f"/events/{event_id}/timeline", params={"bucket": "1s", "max_points": 1000})
+    data = r.json()
+    assert len(data["buckets"]) <= 1000
+    assert data["bucket"] == "5m"
+    assert data["series"][0]["cumulative"][-1] == 300
+
+    r = client.get(
+        f"/events/{event_id}/timeline",
+        params={"bucket": "1s", "from": "2024-05-02T12:00:00", "to": "2024-05-02T12:00:20"},
+    )
+    data = r.json()
+    assert data["bucket"] == "1s"
+    assert len(data["buckets"]) == 21
+    cumulative = data["series"][0]["cumulative"]
+    assert cumulative[0] == 100 and cumulative[9] == 100 and cumulative[10] == 300
+
+    r = client.get(
+        f"/events/{event_id}/timeline",
+        params={"from": "2024-05-02T12:00:00", "to": "2024-05-01T12:00:00"},
+    )
+    assert r.status_code == 400
+
+
+def test_timeline_columnar_and_binary_formats():
+    start = datetime(2024, 4, 2, 9, 0, 0)
+    payload = {
+        "name": "Columnar Event",
+        "start_at": start.isoformat(),
+        "end_at": (start + timedelta(hours=2)).isoformat(),
+    }
+    event_id = client.post("/events/", json=payload).json()["id"]
+    sp_payload = {"name": "Stage", "latitude": 1.0, "longitude": 2.0}
+    sp_id = client.post(f"/events/{event_id}/selling-points", json=sp_payload).json()["id"]
+    client.post(f"/events/selling-points/{sp_id}/epts", json={"provider": "other", "label": "OT-1"})
+    csv_body = (
+        "selling_point,ept,amount_cents,currency,occurred_at,card_last4\n"
+        "Stage,OT-1,100,CHF,2024-04-02T09:00:00,0001\n"
+        "Stage,OT-1,200,CHF,2024-04-02T09:00:30,0002\n"
+        "Stage,OT-1,400,CHF,2024-04-02T09:59:59,0003\n"
+        "Stage,OT-1,800,CHF,2024-04-02T10:00:00.500000,0004\n"
+    ).encode()
+    client.post(
+        f"/events/{event_id}/imports",
+        data={"parser": "mock_worldline"},
+        files={"file": ("columnar.csv", io.BytesIO(csv_body), "text/csv")},
+    )
+    params = {"bucket": "30s"}
+    dense = client.get(f"/events/{event_id}/timeline", params=params).json()
+
+    columnar = client.get(f"/events/{event_id}/timeline", params={**params, "format": "columnar"}).json()
+    assert columnar["count"] == len(dense["buckets"])
+    assert columnar["step_seconds"] == 30
+    series = columnar["series"][0]
+    rebuilt = [series["base"]]
+    for delta in series["deltas"]:
+        rebuilt.append(rebuilt[-1] + delta)
+    assert rebuilt == dense["series"][0]["cumulative"]
+
+    r = client.get(f"/events/{event_id}/timeline", params={**params, "format": "binary"})
+    assert r.headers["content-type"] == "application/octet-stream"
+    (header_len,) = struct.unpack_from("<I", r.content)
+    header = json.loads(r.content[4 : 4 + header_len])
+    assert header["dtype"] == "int32"
+    assert (4 + header_len) % 8 == 0
+    deltas = struct.unpack_from(f"<{header['count'] - 1}i", r.content, 4 + header_len)
+    assert list(deltas) == series["deltas"]
+    assert len(r.content) < len(json.dumps(dense))
+
+
+def test_timeline_etag_and_since_cursor():
+    start = datetime(2024, 6, 1, 10, 0, 0)
+    payload = {
+        "name": "Live Event",
+        "start_at": start.isoformat(),
+        "end_at": (start + timedelta(hours=1)).isoformat(),
+    }
+    event_id = client.post("/events/", json=payload).json()["id"]
+    sp_payload = {"name": "Kiosk", "latitude": 0.0, "longitude": 0.0}
+    sp_id = client.post(f"/events/{event_id}/selling-points", json=sp_payload).json()["id"]
+    client.post(f"/events/selling-points/{sp_id}/epts", json={"provider": "sumup", "label": "K-1"})
+
+    def upload(rows: str) -> None:
+        body = "selling_point,ept,amount_cents,currency,occurred_at,card_last4\n" + rows
+        client.post(
+            f"/events/{event_id}/imports",
+            data={"parser": "mock_worldline"},
+            files={"file": ("live.csv", io.BytesIO(body.encode()), "text/csv")},
+        )
+
+    upload("Kiosk,K-1,100,CHF,2024-06-01T10:05:00,0101\n")
+    params = {"bucket": "10m"}
+    r = client.get(f"/events/{event_id}/timeline", params=params)
+    etag, version = r.headers["etag"], int(r.headers["x-data-version"])
+    assert r.json()["series"][0]["cumulative"] == [0, 100, 100, 100, 100, 100, 100]
+
+    r = client.get(f"/events/{event_id}/timeline", params=params, headers={"If-None-Match": etag})
+    assert r.status_code == 304
+    r = client.get(f"/events/{event_id}/timeline", params={**params, "since": version})
+    assert r.json()["buckets"] == []
+
+    upload("Kiosk,K-1,50,CHF,2024-06-01T10:35:00,0102\n")
+    r = client.get(f"/events/{event_id}/timeline", params=params, headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    r = client.get(f"/events/{event_id}/timeline", params={**params, "since": version})
+    data = r.json()
+    assert data["buckets"][0].startswith("2024-06-01T10:40:00")
+    assert data["series"][0]["cumulative"] == [150, 150, 150]
+
+    summary = client.get(f"/events/{event_id}/summary")
+    r = client.get(f"/events/{event_id}/summary", headers={"If-None-Match": summary.headers["etag"]})
+    assert r.status_code == 304
+    client.patch(f"/events/{event_id}/selling-points/{sp_id}", json={"name": "Kiosk 2"})
+    r = client.get(f"/events/{event_id}/summary", headers={"If-None-Match": summary.headers["etag"]})
+    assert r.status_code == 200
+    assert r.json()["selling_points"][0]["name"] == "Kiosk 2"
+
+
+def test_event_changes_coalesced_and_pruned(monkeypatch):
+    import versions
+    from routers import events as events_router
+
+    start = datetime(2024, 6, 2, 10, 0, 0)
+    payload = {
+        "name": "Changes Event",
+        "start_at": start.isoformat(),
+        "end_at": (start + timedelta(hours=1)).isoformat(),
+    }
+    event_id = client.post("/events/", json=payload).json()["id"]
+    sp_payload = {"name": "Kiosk", "latitude": 0.0, "longitude": 0.0}
+    sp_id = client.post(f"/events/{event_id}/selling-points", json=sp_payload).json()["id"]
+    client.post(f"/events/selling-points/{sp_id}/epts", json={"provider": "sumup", "label": "K-1"})
+    params = {"bucket": "10m"}
+    version = int(client.get(f"/events/{event_id}/timeline", params=params).headers["x-data-version"])
+
+    # Every chunk commit moves the version, but the import adds a single row.
+    monkeypatch.setattr(events_router, "CHUNK_SIZE", 2)
+    body = "selling_point,ept,amount_cents,currency,occurred_at,card_last4\n" + "".join(
+        f"Kiosk,K-1,10,CHF,2024-06-02T10:{50 + i}:00,{i:04d}\n" for i in range(6)
+    )
+    client.post(
+        f"/events/{event_id}/imports",
+        data={"parser": "mock_worldline"},
+        files={"file": ("chunks.csv", io.BytesIO(body.encode()), "text/csv")},
+    )
+    db = SessionLocal()
+    changes = (
+        db.query(models.EventChange)
+        .filter_by(event_id=event_id)
+        .order_by(models.EventChange.version)
+        .all()
+    )
+    assert (changes[-1].from_version, changes[-1].version) == (version + 1, version + 3)
+    assert len(changes) == 3
+    db.close()
+    r = client.get(f"/events/{event_id}/timeline", params={**params, "since": version + 1})
+    data = r.json()
+    assert data["buckets"][0].startswith("2024-06-02T10:50:00")
+    assert data["series"][0]["cumulative"][-1] == 60
+
+    # Old rows are pruned; a client holding a pruned version gets everything.
+    monkeypatch.setattr(versions, "CHANGES_RETAINED", 2)
+    client.patch(f"/events/{event_id}/selling-points/{sp_id}", json={"name": "Kiosk 2"})
+    client.patch(f"/events/{event_id}/selling-points/{sp_id}", json={"name": "Kiosk 3"})
+    db = SessionLocal()
+    assert db.query(models.EventChange).filter_by(event_id=event_id).count() == 2
+    db.close()
+    r = client.get(f"/events/{event_id}/timeline", params={**params, "since": version})
+    assert r.json()["buckets"][0].startswith("2024-06-02T10:00:00")
+
+def test_stream_publishes_import_deltas():
+    payload = {
+        "name": "Stream Event",
+        "start_at": datetime(2024, 7, 1, 9).isoformat(),
+        "end_at": datetime(2024, 7, 1, 12).isoformat(),
+    }
+    event_id = client.post("/events/", json=payload).json()["id"]
+    sp_payload = {"name": "Gate S", "latitude": 0.0, "longitude": 0.0}
+    sp_id = client.post(f"/events/{event_id}/selling-points", json=sp_payload).json()["id"]
+    ept_id = client.post(
+        f"/events/selling-points/{sp_id}/epts", json={"provider": "worldline", "label": "S-1"}
+    ).json()["id"]
+    body = (
+        "selling_point,ept,amount_cents,currency,occurred_at,card_last4\n"
+        "Gate S,S-1,120,CHF,2024-07-01T10:00:00,7001\n"
+        "Gate S,S-1,130,CHF,2024-07-01T10:01:00,7002\n"
+    ).encode()
+
+    def upload() -> None:
+        client.post(
+            f"/events/{event_id}/imports",
+            data={"parser": "mock_worldline"},
+            files={"file": ("stream.csv", io.BytesIO(body), "text/csv")},
+        )
+
+    async def scenario() -> dict:
+        queue = publisher.subscribe(event_id)
+        try:
+            await asyncio.to_thread(upload)
+            return json.loads(await asyncio.wait_for(queue.get(), 5))
+        finally:
+            publisher.unsubscribe(event_id, queue)
+
+    message = asyncio.run(scenario())
+    assert message["type"] == "totals"
+    assert message["selling_points"] == {sp_id: 250}
+    assert message["epts"] == {ept_id: 250}
+    assert message["tx_count"] == 2
+
+    assert client.get("/events/missing/stream").status_code == 404
+
+    # A subscriber that falls a full queue behind gets a refresh instead of an
+    # incomplete run of deltas.
+    async def overflow() -> list[dict]:
+        queue = publisher.subscribe("overflow")
+        try:
+            for version in range(1, publisher.queue_size + 2):
+                publisher.publish("overflow", {"type": "totals", "version": version})
+            await asyncio.sleep(0)
+            publisher.publish("overflow", {"type": "totals", "version": publisher.queue_size + 2})
+            await asyncio.sleep(0)
+            return [json.loads(queue.get_nowait()) for _ in range(queue.qsize())]
+        finally:
+            publisher.unsubscribe("overflow", queue)
+
+    messages = asyncio.run(overflow())
+    assert messages == [
+        {"type": "refresh", "version": publisher.queue_size + 1},
+        {"type": "totals", "version": publisher.queue_size + 2},
+    ]
+
+
+def test_summary_cache_hits_and_invalidation():
+    payload = {
+        "name": "Cached Event",
+        "start_at": datetime(2024, 8, 1, 9).isoformat(),
+        "end_at": datetime(2024, 8, 1, 12).isoformat(),
+    }
+    event_id = client.post("/events/", json=payload).json()["id"]
+    sp_payload = {"name": "Bar C", "latitude": 0.0, "longitude": 0.0}
+    sp_id = client.post(f"/events/{event_id}/selling-points", json=sp_payload).json()["id"]
+    client.post(f"/events/selling-points/{sp_id}/epts", json={"provider": "sumup", "label": "C-1"})
+
+    before = client.get("/cache/stats").json()
+    first = client.get(f"/events/{event_id}/summary").json()
+    second = client.get(f"/events/{event_id}/summary").json()
+    after = client.get("/cache/stats").json()
+    assert first == second
+    assert after["misses"] == before["misses"] + 1
+    assert after["hits"] == before["hits"] + 1
+
+    body = (
+        "selling_point,ept,amount_cents,currency,occurred_at,card_last4\n"
+        "Bar C,C-1,990,CHF,2024-08-01T10:00:00,8001\n"
+    ).encode()
+    client.post(
+        f"/events/{event_id}/imports",
+        data={"parser": "mock_worldline"},
+        files={"file": ("cache.csv", io.BytesIO(body), "text/csv")},
+    )
+    assert client.get(f"/events/{event_id}/summary").json()["selling_points"][0]["total_cents"] == 990
+
+    # Writes made outside this process do not invalidate the local entry; the
+    # version check turns it into a miss.
+    client.get(f"/events/{event_id}/summary")
+    with engine.begin() as conn:
+        conn.execute(
+            models.Event.__table__.update()
+            .where(models.Event.id == event_id)
+            .values(data_version=models.Event.data_version + 1)
+        )
+    before = client.get("/cache/stats").json()
+    r = client.get(f"/events/{event_id}/summary")
+    assert client.get("/cache/stats").json()["misses"] == before["misses"] + 1
+    assert r.headers["ETag"] == client.get(f"/events/{event_id}/summary").headers["ETag"]
+
+    ept_id = first["selling_points"][0]["epts"][0]["id"]
+    client.patch(f"/events/selling-points/{sp_id}/epts/{ept_id}", json={"label": "C-2"})
+    summary = client.get(f"/events/{event_id}/summary").json()
+    assert summary["selling_points"][0]["epts"][0]["label"] == "C-2"
+
+    # A replica that lags behind the primary neither serves nor caches its
+    # older summary.
+    import db
+
+    class LaggingReplica(db.QueryRunner):
+        async def run(self, fn, *args):
+            version, _ = await super().run(fn, *args)
+            return version - 1, b'{"event_id": "stale", "selling_points": []}'
+
+    async def lagging():
+        session = SessionLocal()
+        try:
+            yield LaggingReplica(session)
+        finally:
+            session.close()
+
+    from cache import summary_cache
+
+    summary_cache.invalidate_local(event_id)
+    app.dependency_overrides[db.get_read_query_runner] = lagging
+    try:
+        assert client.get(f"/events/{event_id}/summary").json()["event_id"] == event_id
+    finally:
+        app.dependency_overrides.clear()
+    assert client.get(f"/events/{event_id}/summary").json()["event_id"] == event_id
+
+    client.delete(f"/events/{event_id}")
+    assert client.get(f"/events/{event_id}/summary").status_code == 404
+
+
+def test_request_metrics_and_profile(monkeypatch):
+    payload = {
+        "name": "Metrics Event",
+        "start_at": datetime(2024, 9, 1, 9).isoformat(),
+        "end_at": datetime(2024, 9, 1, 12).isoformat(),
+    }
+    event_id = client.post("/events/", json=payload).json()["id"]
+    r = client.get(f"/events/{event_id}/summary")
+    timing = r.headers["server-timing"]
+    assert timing.startswith("db;dur=")
+    assert "serialize;dur=" in timing and "total;dur=" in timing
+    queries = int(timing.split('desc="')[1].split(" queries")[0])
+    assert queries > 0
+
+    text = client.get("/metrics").text
+    assert "# TYPE db_queries_total counter" in text
+    assert 'http_requests_total{method="GET",route="/events/{event_id}/summary",status="200"}' in text
+
+    # Profiling is only honoured in debug mode.
+    assert client.get(f"/events/{event_id}/summary", params={"profile": "1"}).json()["event_id"] == event_id
+    monkeypatch.setattr(metrics.settings, "debug", True)
+    r = client.get(f"/events/{event_id}/summary", params={"profile": "1"})
+    assert r.headers["content-type"].startswith("text/plain")
+    assert "summary" in r.text
+
+
+def test_engine_configuration():
+    import db
+
+    # Without READ_DATABASE_URL, summary and timeline reads share the primary.
+    assert db.read_engine is db.engine
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == 5000
+    memory = db.make_engine("sqlite://")
+    with memory.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "memory"
+
+
+def test_async_read_path_matches_sync():
+    import db
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    from sqlalchemy.pool import NullPool
+
+    payload = {
+        "name": "Async Event",
+        "start_at": datetime(2024, 9, 2, 9).isoformat(),
+        "end_at": datetime(2024, 9, 2, 12).isoformat(),
+    }
+    event_id = client.post("/events/", json=payload).json()["id"]
+    sp_payload = {"name": "Bar D", "latitude": 0.0, "longitude": 0.0}
+    sp_id = client.post(f"/events/{event_id}/selling-points", json=sp_payload).json()["id"]
+    client.post(f"/events/selling-points/{sp_id}/epts", json={"provider": "sumup", "label": "D-1"})
+    body = (
+        "selling_point,ept,amount_cents,currency,occurred_at,card_last4\n"
+        "Bar D,D-1,700,CHF,2024-09-02T10:00:00,9001\n"
+    ).encode()
+    client.post(
+        f"/events/{event_id}/imports",
+        data={"parser": "mock_worldline"},
+        files={"file": ("async.csv", io.BytesIO(body), "text/csv")},
+    )
+    urls = [
+        "/events/",
+        f"/events/{event_id}/selling-points",
+        f"/events/selling-points/{sp_id}/epts",
+        f"/events/{event_id}/timeline?bucket=1h",
+        f"/events/{event_id}/summary",
+    ]
+    expected = [client.get(url).json() for url in urls]
+
+    # TestClient runs each request on a fresh event loop, so connections are not pooled.
+    async_engine = db.make_async_engine(db.settings.database_url, poolclass=NullPool)
+    runner = db.query_runner(db.SessionLocal, async_sessionmaker(async_engine))
+    app.dependency_overrides[db.get_query_runner] = runner
+    app.dependency_overrides[db.get_read_query_runner] = runner
+    try:
+        assert [client.get(url).json() for url in urls] == expected
+        from cache import summary_cache
+
+        summary_cache.invalidate_local(event_id)
+        r = client.get(f"/events/{event_id}/summary")
+        assert r.json() == expected[-1]
+        assert 'desc="0 queries' not in r.headers["server-timing"]
+        assert client.get("/events/missing/timeline").status_code == 404
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_fast_json_responses_match_schemas():
+    payload = {
+        "name": "Fast JSON Event",
+        "start_at": datetime(2024, 9, 3, 9).isoformat(),
+        "end_at": datetime(2024, 9, 3, 12).isoformat(),
+    }
+    event_id = client.post("/events/", json=payload).json()["id"]
+    sp_payload = {"name": "Bar E", "latitude": 1.5, "longitude": 2.5}
+    sp_id = client.post(f"/events/{event_id}/selling-points", json=sp_payload).json()["id"]
+    client.post(f"/events/selling-points/{sp_id}/epts", json={"provider": "sumup", "label": "E-1"})
+    body = (
+        "selling_point,ept,amount_cents,currency,occurred_at,card_last4\n"
+        "Bar E,E-1,300,CHF,2024-09-03T10:00:00.250000,1001\n"
+    ).encode()
+    client.post(
+        f"/events/{event_id}/imports",
+        data={"parser": "mock_worldline"},
+        files={"file": ("fast.csv", io.BytesIO(body), "text/csv")},
+    )
+
+    for cached in (False, True):
+        r = client.get(f"/events/{event_id}/summary")
+        assert r.headers["content-type"] == "application/json"
+        assert "etag" in r.headers
+        summary = schemas.EventSummary.model_validate(r.json())
+        assert summary.model_dump(mode="json") == r.json()
+    ept = summary.selling_points[0].epts[0]
+    assert (ept.total_cents, ept.tx_count, ept.avg_ticket_cents) == (300, 1, 300.0)
+    assert r.json()["selling_points"][0]["epts"][0]["first_at"] == "2024-09-03T10:00:00.250000"
+
+    r = client.get(f"/events/{event_id}/timeline", params={"bucket": "1h"})
+    assert "x-data-version" in r.headers
+    data = schemas.EventTimeline.model_validate(r.json())
+    assert data.model_dump(mode="json") == r.json()
+    assert data.series[0].cumulative == [0, 0, 300, 300]
+    r = client.get(f"/events/{event_id}/timeline", params={"bucket": "1h", "format": "columnar"})
+    data = schemas.EventTimelineColumnar.model_validate(r.json())
+    assert data.model_dump(mode="json") == r.json()
+
+    # The response models still document the endpoints.
+    paths = app.openapi()["paths"]
+    ok = paths["/events/{event_id}/summary"]["get"]["responses"]["200"]
+    assert ok["content"]["application/json"]["schema"]["$ref"].endswith("/EventSummary")
+
+
+def test_keyset_pagination_and_transactions():
+    payload = {
+        "name": "Paged Event",
+        "start_at": datetime(2024, 9, 4, 9).isoformat(),
+        "end_at": datetime(2024, 9, 4, 12).isoformat(),
+    }
+    event_id = client.post("/events/", json=payload).json()["id"]
+    sp_ids = {}
+    for name in ("Bar G", "Bar F"):
+        sp_payload = {"name": name, "latitude": 0.0, "longitude": 0.0}
+        sp_ids[name] = client.post(f"/events/{event_id}/selling-points", json=sp_payload).json()["id"]
+        client.post(
+            f"/events/selling-points/{sp_ids[name]}/epts",
+            json={"provider": "sumup", "label": name[-1] + "-1"},
+        )
+    # Same timestamps across selling points: ties are broken by id.
+    body = "selling_point,ept,amount_cents,currency,occurred_at,card_last4\n" + "".join(
+        f"{sp},{sp[-1]}-1,{100 + i},CHF,2024-09-04T10:0{i // 2}:00,{i:04d}\n"
+        for i in range(7)
+        for sp in ("Bar F", "Bar G")
+    )
+    client.post(
+        f"/events/{event_id}/imports",
+        data={"parser": "mock_worldline"},
+        files={"file": ("paged.csv", io.BytesIO(body.encode()), "text/csv")},
+    )
+
+    r = client.get(f"/events/{event_id}/selling-points", params={"limit": 1})
+    assert [sp["name"] for sp in r.json()] == ["Bar F"]
+    r = client.get(
+        f"/events/{event_id}/selling-points",
+        params={"limit": 1, "cursor": r.headers["x-next-cursor"]},
+    )
+    assert [sp["name"] for sp in r.json()] == ["Bar G"]
+    assert "x-next-cursor" not in r.headers
+
+    url = f"/events/{event_id}/transactions"
+    everything = client.get(url, params={"limit": 100}).json()
+    assert len(everything) == 14
+    assert everything == sorted(everything, key=lambda t: (t["occurred_at"], t["id"]))
+    pages, cursor = [], None
+    while True:
+        params = {"limit": 4, "fields": "id,amount_cents"}
+        if cursor:
+            params["cursor"] = cursor
+        r = client.get(url, params=params)
+        pages.append(r.json())
+        cursor = r.headers.get("x-next-cursor")
+        if not cursor:
+            break
+    assert [len(p) for p in pages] == [4, 4, 4, 2]
+    assert [t for p in pages for t in p] == [
+        {"id": t["id"], "amount_cents": t["amount_cents"]} for t in everything
+    ]
+
+    r = client.get(
+        url,
+        params={
+            "selling_point_id": sp_ids["Bar G"],
+            "from": "2024-09-04T10:01:00",
+            "to": "2024-09-04T10:02:00",
+            "fields": "amount_cents",
+        },
+    )
+    assert sorted(t["amount_cents"] for t in r.json()) == [102, 103, 104, 105]
+
+    assert client.get(url, params={"fields": "id,secret"}).status_code == 400
+    assert client.get(url, params={"cursor": "not-a-cursor"}).status_code == 400
+    assert client.get("/events/missing/transactions").status_code == 404
+
+
+def test_streaming_exports(monkeypatch):
+    import csv as csv_module
+    import gzip
+
+    import exports
+    import pyarrow.parquet as pq
+
+    payload = {
+        "name": "Export Event",
+        "start_at": datetime(2024, 9, 5, 9).isoformat(),
+        "end_at": datetime(2024, 9, 5, 12).isoformat(),
+    }
+    event_id = client.post("/events/", json=payload).json()["id"]
+    sp_payload = {"name": "Bar H", "latitude": 0.0, "longitude": 0.0}
+    sp_id = client.post(f"/events/{event_id}/selling-points", json=sp_payload).json()["id"]
+    client.post(f"/events/selling-points/{sp_id}/epts", json={"provider": "sumup", "label": "H-1"})
+    body = "selling_point,ept,amount_cents,currency,occurred_at,card_last4\n" + "".join(
+        f"Bar H,H-1,{100 + i},CHF,2024-09-05T10:{i:02d}:00,{i:04d}\n" for i in range(25)
+    )
+    client.post(
+        f"/events/{event_id}/imports",
+        data={"parser": "mock_worldline"},
+        files={"file": ("export.csv", io.BytesIO(body.encode()), "text/csv")},
+    )
+    # Small batches and row groups so the streaming paths are exercised.
+    monkeypatch.setattr(exports, "EXPORT_BATCH_ROWS", 4)
+    monkeypatch.setattr(exports, "PARQUET_ROW_GROUP_ROWS", 10)
+
+    url = f"/events/{event_id}/exports/transactions"
+    r = client.get(url)
+    assert r.headers["content-disposition"] == 'attachment; filename="Export-Event-transactions.csv"'
+    rows = list(csv_module.DictReader(io.StringIO(r.text)))
+    assert len(rows) == 25
+    assert rows[0]["selling_point"] == "Bar H" and rows[0]["ept"] == "H-1"
+    assert [int(row["amount_cents"]) for row in rows] == list(range(100, 125))
+
+    r = client.get(url, params={"compression": "gzip", "from": "2024-09-05T10:20:00"})
+    assert r.headers["content-type"] == "application/gzip"
+    assert len(gzip.decompress(r.content).decode().splitlines()) == 1 + 5
+
+    r = client.get(url, params={"format": "parquet"})
+    parquet = pq.ParquetFile(io.BytesIO(r.content))
+    assert parquet.metadata.num_row_groups == 3
+    assert parquet.read().column("amount_cents").to_pylist() == list(range(100, 125))
+
+    r = client.get(f"/events/{event_id}/exports/summary", params={"format": "parquet"})
+    summary = pq.read_table(io.BytesIO(r.content)).to_pylist()
+    assert summary[0]["total_cents"] == sum(range(100, 125)) and summary[0]["tx_count"] == 25
+    rows = list(csv_module.DictReader(io.StringIO(client.get(f"/events/{event_id}/exports/summary").text)))
+    assert rows[0]["ept"] == "H-1" and rows[0]["first_at"] == "2024-09-05T10:00:00"
+
+    assert client.get("/events/missing/exports/transactions").status_code == 404
+
+
+def test_import_ledger_skips_unchanged_files_and_imports_tails(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "import_dir", str(tmp_path))
+    payload = {
+        "name": "Ledger Event",
+        "start_at": datetime(2024, 10, 1, 9).isoformat(),
+        "end_at": datetime(2024, 10, 1, 12).isoformat(),
+    }
+    event_id = client.post("/events/", json=payload).json()["id"]
+    sp_payload = {"name": "Bar L", "latitude": 0.0, "longitude": 0.0}
+    sp_id = client.post(f"/events/{event_id}/selling-points", json=sp_payload).json()["id"]
+    client.post(f"/events/selling-points/{sp_id}/epts", json={"provider": "sumup", "label": "L-1"})
+    header = "selling_point,ept,amount_cents,currency,occurred_at,card_last4\n"
+    rows = [f"Bar L,L-1,{100 + i},CHF,2024-10-01T10:{i:02d}:00,{i:04d}\n" for i in range(30)]
+
+    def upload(body, name="export.csv"):
+        return client.post(
+            f"/events/{event_id}/imports",
+            data={"parser": "mock_worldline"},
+            files={"file": (name, io.BytesIO(body.encode()), "text/csv")},
+        )
+
+    first = upload(header + "".join(rows[:10]))
+    assert first.json()["processed"] == 10
+    assert upload(header + "".join(rows[:10]), "again.csv").status_code == 409
+
+    # A cumulative export only parses the rows added since the first one.
+    data = upload(header + "".join(rows[:20])).json()
+    assert (data["processed"], data["inserted"], data["skipped_duplicates"]) == (10, 10, 0)
+
+    # Rows that failed are read again on the next export.
+    data = upload(header + "".join(rows[:20]) + "Unknown,X-1,5,CHF,2024-10-01T11:00:00,9999\n").json()
+    assert (data["processed"], data["errors"]) == (1, 1)
+    data = upload(header + "".join(rows[:20]) + "Unknown,X-1,5,CHF,2024-10-01T11:00:00,9999\n" + rows[20]).json()
+    assert (data["processed"], data["inserted"], data["errors"]) == (2, 1, 1)
+
+    # An interrupted import resumes after its last committed block.
+    monkeypatch.setattr(ledger, "LEDGER_BLOCK_BYTES", 200)
+    body = header + "".join(rows[:30])
+    db = SessionLocal()
+    tracked = ledger.TrackedImport(db, event_id, io.BytesIO(body.encode()), "resume.csv")
+    tracked.entry.completed = False
+    tracked.entry.committed_offset = len((header + "".join(rows[:25])).encode())
+    tracked.entry.prefix_hash = hashlib.sha256((header + "".join(rows[:25])).encode()).hexdigest()
+    tracked.entry.processed = tracked.entry.inserted = 25
+    db.commit()
+    db.close()
+    # Only the rows after the committed offset are parsed; the counters cover
+    # the whole file.
+    data = upload(body, "resume.csv").json()
+    assert (data["processed"], data["inserted"]) == (30, 30)
+
+    r = client.post(
+        f"/events/{event_id}/imports/bulk",
+        files=[("files", ("export.csv", body.encode(), "text/csv"))],
+    )
+    assert r.json()["processed"] == 0
+    assert "already imported" in r.json()["files"][0]["error_message"]
+    r = client.get(f"/events/{event_id}/summary")
+    assert r.json()["selling_points"][0]["tx_count"] == 26
+    db = SessionLocal()
+    entries = db.query(models.ImportFile).filter_by(event_id=event_id).all()
+    db.close()
+    assert all(e.completed and e.file_hash for e in entries)
+
+    # Deleting an EPT removes its transactions, so the ledger forgets the files.
+    ept_id = client.get(f"/events/selling-points/{sp_id}/epts").json()[0]["id"]
+    client.delete(f"/events/selling-points/{sp_id}/epts/{ept_id}")
+    client.post(f"/events/selling-points/{sp_id}/epts", json={"provider": "sumup", "label": "L-1"})
+    data = upload(body).json()
+    assert (data["processed"], data["inserted"]) == (30, 30)
+
+
+def test_copy_import_staging_and_accounting(monkeypatch):
+    import csv as csv_module
+    from collections import namedtuple
+
+    from sqlalchemy import text
+    from sqlalchemy.orm import Session
+
+    # INSERT_STAGED returns the inserted rows plus one row carrying the
+    # unresolved count; the remaining staged rows were duplicates.
+    Row = namedtuple("Row", "selling_point_id ept_id occurred_at amount_cents unresolved")
+    at = datetime(2024, 11, 1, 10)
+    result = [Row("sp", "e", at, 100, None), Row("sp", "e", at, 200, None), Row(None, None, None, None, 3)]
+    new_rows, unresolved, skipped = importer._staged_counts(result, 10)
+    assert (len(new_rows), unresolved, skipped) == (2, 3, 5)
+    assert importer._staged_counts([Row(None, None, None, None, 0)], 4) == ([], 0, 4)
+
+    # The staging CSV carries the generated id and the row key as bytea hex.
+    copied = {}
+
+    class Cursor:
+        def copy_expert(self, sql, buffer):
+            copied["sql"], copied["rows"] = sql, list(csv_module.reader(buffer))
+
+        def close(self):
+            pass
+
+    class Connection:
+        connection = type("Raw", (), {"cursor": lambda self: Cursor()})()
+
+    fake_db = type("FakeSession", (), {"connection": lambda self: Connection()})()
+    key = parsers.row_key("Bar", "P-1", "1")
+    importer._copy_rows(fake_db, [("Bar", "P-1", 150, "CHF", at, "1111", key)])
+    assert copied["sql"].startswith(f"COPY import_staging ({importer.STAGING_COLUMNS})")
+    (row,) = copied["rows"]
+    assert len(row[0]) == 36 and row[1:] == ["Bar", "P-1", "150", "CHF", at.isoformat(), "1111", "\\x" + key.hex()]
+
+    if engine.dialect.name != "postgresql":
+        pytest.skip("the COPY import path needs Postgres (DATABASE_URL)")
+
+    payload = {
+        "name": "Copy Event",
+        "start_at": datetime(2024, 11, 1, 9).isoformat(),
+        "end_at": datetime(2024, 11, 1, 12).isoformat(),
+    }
+    event_id = client.post("/events/", json=payload).json()["id"]
+    sp_payload = {"name": "Bar P", "latitude": 0.0, "longitude": 0.0}
+    sp_id = client.post(f"/events/{event_id}/selling-points", json=sp_payload).json()["id"]
+    client.post(f"/events/selling-points/{sp_id}/epts", json={"provider": "sumup", "label": "P-1"})
+    body = (
+        "selling_point,ept,amount_cents,currency,occurred_at,card_last4\n"
+        "Bar P,P-1,100,CHF,2024-11-01T10:00:00,1111\n"
+        "Bar P,P-1,200,CHF,2024-11-01T10:05:00,2222\n"
+        "Bar P,P-1,100,CHF,2024-11-01T10:00:00,1111\n"
+        "Unknown,P-1,300,CHF,2024-11-01T10:10:00,3333\n"
+    ).encode()
+    monkeypatch.setattr(importer.settings, "import_mode", "copy")
+    parser = PARSER_REGISTRY["mock_worldline"]
+    with engine.connect() as conn:
+        # One connection, so the session-scoped temp table can be inspected.
+        db = Session(bind=conn)
+        summary = importer.import_transactions(
+            db, event_id, parser.name, parsers.parse_chunks(parser, io.BytesIO(body), len(body), 2)
+        )
+        # The in-file duplicate reaches the staging table and is skipped by ON CONFLICT.
+        assert summary.model_dump() == {"processed": 4, "inserted": 2, "skipped_duplicates": 1, "errors": 1}
+        assert db.execute(text("SELECT count(*) FROM import_staging")).scalar() == 0
+        summary = importer.import_transactions(
+            db, event_id, parser.name, parsers.parse_chunks(parser, io.BytesIO(body), len(body), 2)
+        )
+        assert summary.model_dump() == {"processed": 4, "inserted": 0, "skipped_duplicates": 3, "errors": 1}
+        db.close()
+    r = client.get(f"/events/{event_id}/summary")
+    assert r.json()["selling_points"][0]["total_cents"] == 300
+
+
+def test_copy_import_resume_counters(monkeypatch):
+    payload = {
+        "name": "Copy Resume Event",
+        "start_at": datetime(2024, 11, 2, 9).isoformat(),
+        "end_at": datetime(2024, 11, 2, 12).isoformat(),
+    }
+    event_id = client.post("/events/", json=payload).json()["id"]
+    sp_payload = {"name": "Bar R", "latitude": 0.0, "longitude": 0.0}
+    sp_id = client.post(f"/events/{event_id}/selling-points", json=sp_payload).json()["id"]
+    client.post(f"/events/selling-points/{sp_id}/epts", json={"provider": "sumup", "label": "R-1"})
+    header = "selling_point,ept,amount_cents,currency,occurred_at,card_last4\n"
+    rows = [f"Bar R,R-1,{100 + i},CHF,2024-11-02T10:{i:02d}:00,{i:04d}\n" for i in range(30)]
+    body = (header + "".join(rows)).encode()
+    parser = PARSER_REGISTRY["mock_worldline"]
+    # About five rows per block, parsed in chunks of two.
+    monkeypatch.setattr(ledger, "LEDGER_BLOCK_BYTES", 200)
+
+    # Progress reported in the middle of a block, as a batching importer
+    # does, is not recorded; at a block end it is.
+    db = SessionLocal()
+    tracked = ledger.TrackedImport(db, event_id, io.BytesIO(body), "blocks.csv")
+    chunks = tracked.chunks(parser, 2)
+    handed = len(next(chunks))
+    assert not tracked.at_block_end()
+    tracked.progress(schemas.ImportSummary(processed=handed, inserted=handed, skipped_duplicates=0, errors=0))
+    assert tracked.entry.committed_offset == len(header)
+    while not tracked.at_block_end():
+        handed += len(next(chunks))
+    tracked.progress(schemas.ImportSummary(processed=handed, inserted=handed, skipped_duplicates=0, errors=0))
+    assert tracked.entry.committed_offset == len(header) + len("".join(rows[:handed]))
+    assert tracked.entry.processed == handed
+    tracked.discard()
+    db.close()
+
+    if engine.dialect.name != "postgresql":
+        pytest.skip("the COPY import path needs Postgres (DATABASE_URL)")
+
+    # A COPY import that crashes after committing some blocks resumes with
+    # the counters of the whole file; batches that straddle blocks are
+    # flushed at the block end.
+    monkeypatch.setattr(importer.settings, "import_mode", "copy")
+    monkeypatch.setattr(importer, "COPY_BATCH_SIZE", 3)
+
+    class Crash(Exception):
+        pass
+
+    def crash(summary):
+        if summary.processed > 10:
+            raise Crash
+
+    db = SessionLocal()
+    with pytest.raises(Crash):
+        importer.import_file(db, event_id, parser, io.BytesIO(body), 2, "resume.csv", on_progress=crash)
+    db.close()
+    db = SessionLocal()
+    summary = importer.import_file(db, event_id, parser, io.BytesIO(body), 2, "resume.csv")
+    db.close()
+    assert summary.model_dump() == {"processed": 30, "inserted": 30, "skipped_duplicates": 0, "errors": 0}
+    r = client.get(f"/events/{event_id}/summary")
+    assert r.json()["selling_points"][0]["tx_count"] == 30
@@ -0,0 +1,159 @@
+import struct
+from collections import defaultdict
+from datetime import datetime, timedelta
+from itertools import pairwise
+
+from sqlalchemy import BigInteger, Integer, case, cast, func, literal, select
+from sqlalchemy.orm import Session
+
+import fastjson, models, rollups
+
+EPOCH = datetime(1970, 1, 1)
+BUCKET_UNITS = {"s": "seconds", "m": "minutes", "h": "hours"}
+DEFAULT_MAX_POINTS = 2000
+NICE_STEPS = (
+    [timedelta(seconds=n) for n in (1, 2, 5, 10, 15, 30)]
+    + [timedelta(minutes=n) for n in (1, 2, 5, 10, 15, 30)]
+    + [timedelta(hours=n) for n in (1, 2, 3, 6, 12, 24)]
+)
+
+
+def parse_bucket(bucket: str) -> timedelta:
+    if not bucket[:-1].isdigit() or bucket[-1] not in BUCKET_UNITS or int(bucket[:-1]) == 0:
+        raise ValueError(f"Invalid bucket {bucket!r}")
+    return timedelta(**{BUCKET_UNITS[bucket[-1]]: int(bucket[:-1])})
+
+
+def format_bucket(step: timedelta) -> str:
+    seconds = int(step.total_seconds())
+    for suffix, size in (("h", 3600), ("m", 60)):
+        if seconds % size == 0:
+            return f"{seconds // size}{suffix}"
+    return f"{seconds}s"
+
+
+def plan_buckets(
+    start: datetime, end: datetime, step: timedelta, max_points: int
+) -> tuple[timedelta, int]:
+    # Coarsen the step to a whole multiple of itself so that at most max_points
+    # buckets fit between start and end, preferring round steps (which also keep
+    # the rollup path usable).
+    if end < start:
+        return step, 0
+    count = (end - start) // step + 1
+    if count > max_points:
+        coarse = step * -(-(count - 1) // (max_points - 1))
+        step = next(
+            (nice for nice in NICE_STEPS if nice >= coarse and nice % step == timedelta(0)),
+            coarse,
+        )
+        count = (end - start) // step + 1
+    return step, count
+
+
+def _micros(delta: timedelta) -> int:
+    return delta // timedelta(microseconds=1)
+
+
+def _epoch_micros(db: Session, column):
+    if db.get_bind().dialect.name == "postgresql":
+        return cast(func.round(func.extract("epoch", column) * 1_000_000), BigInteger)
+    # SQLite stores DateTime as "YYYY-MM-DD HH:MM:SS.ffffff"; strftime('%s')
+    # drops the fraction, so the microseconds are read back from the string.
+    return cast(func.strftime("%s", column), Integer) * 1_000_000 + cast(
+        func.substr(column, 21, 6), Integer
+    )
+
+
+def cumulative_series(
+    db: Session, event_id: str, start: datetime, step: timedelta, count: int
+) -> dict[str, list[int]]:
+    # Cumulative totals per selling point at start + i * step for i < count; the
+    # value at bucket time T includes every transaction with occurred_at <= T.
+    if count <= 0:
+        return {}
+    last = start + step * (count - 1)
+    if rollups.is_aligned(start, step):
+        rollup = models.TransactionRollup
+        table, at, amount = rollup, rollup.bucket_end, rollup.sum_cents
+    else:
+        tx = models.Transaction
+        table, at, amount = tx, tx.occurred_at, tx.amount_cents
+
+    step_us = _micros(step)
+    offset = _epoch_micros(db, at) - literal(_micros(start - EPOCH))
+    # Index of the first bucket boundary at or after the timestamp (ceil division).
+    idx = case((at <= start, 0), else_=(offset + (step_us - 1)) // step_us).label("idx")
+    running = func.sum(func.sum(amount)).over(
+        partition_by=table.selling_point_id, order_by=idx
+    )
+    rows = db.execute(
+        select(table.selling_point_id, idx, running)
+        .where(table.event_id == event_id, at <= last)
+        .group_by(table.selling_point_id, idx)
+        .order_by(table.selling_point_id, idx)
+    )
+
+    points: dict[str, list[tuple[int, int]]] = defaultdict(list)
+    for sp_id, bucket_idx, total in rows:
+        # int(): the running SUM() is a Decimal on Postgres.
+        points[sp_id].append((bucket_idx, int(total)))
+
+    series: dict[str, list[int]] = {}
+    for sp_id, sp_points in points.items():
+        cum = [0] * count
+        for (bucket_idx, total), (next_idx, _) in pairwise(sp_points + [(count, 0)]):
+            cum[bucket_idx:next_idx] = [total] * (next_idx - bucket_idx)
+        series[sp_id] = cum
+    return series
+
+
+def to_columnar(
+    event: models.Event,
+    start: datetime,
+    step: timedelta,
+    count: int,
+    sps: list[models.SellingPoint],
+    cumulative: dict[str, list[int]],
+) -> dict:
+    # Plain dict shaped like schemas.EventTimelineColumnar.
+    series = []
+    for sp in sps:
+        cum = cumulative.get(sp.id, [0] * count)
+        series.append(
+            {
+                "selling_point_id": sp.id,
+                "lat": sp.latitude,
+                "lng": sp.longitude,
+                "base": cum[0] if cum else 0,
+                "deltas": [b - a for a, b in pairwise(cum)],
+            }
+        )
+    return {
+        "event": {"start_at": event.start_at, "end_at": event.end_at},
+        "bucket": format_bucket(step),
+        "start": start,
+        "step_seconds": int(step.total_seconds()),
+        "count": count,
+        "series": series,
+    }
+
+
+def pack_columnar(columnar: dict) -> bytes:
+    # Layout: uint32 LE header length, JSON header (series without deltas, padded
+    # with spaces to an 8-byte boundary), then every series' deltas back to back
+    # as little-endian int32, or int64 when a delta does not fit.
+    deltas = [d for series in columnar["series"] for d in series["deltas"]]
+    wide = any(not -(2**31) <= d < 2**31 for d in deltas)
+    header = {
+        **columnar,
+        "series": [
+            {key: value for key, value in series.items() if key != "deltas"}
+            for series in columnar["series"]
+        ],
+        "dtype": "int64" if wide else "int32",
+    }
+    encoded = fastjson.dumps(header)
+    encoded += b" " * (-(4 + len(encoded)) % 8)
+    body = struct.pack(f"<{len(deltas)}{'q' if wide else 'i'}", *deltas)
+    return struct.pack("<I", len(encoded)) + encoded + body
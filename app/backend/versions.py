@@ -0,0 +1,107 @@
+import hashlib
+from datetime import datetime
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.orm import Session
+
+import models
+
+# Session.info key collecting the events changed by the pending transaction; they
+# are invalidated in the summary cache once it commits.
+CHANGED_EVENTS = "changed_events"
+# Change rows are kept for this many versions; clients holding an older version
+# get a full response instead of a delta.
+CHANGES_RETAINED = 1000
+
+
+def mark_changed(db: Session, event_id: str) -> None:
+    db.info.setdefault(CHANGED_EVENTS, set()).add(event_id)
+
+
+def _next_version(db: Session, event_id: str) -> int:
+    # Runs inside the caller's transaction so the version only moves once the
+    # change itself is committed.
+    version = db.execute(
+        update(models.Event)
+        .where(models.Event.id == event_id)
+        .values(data_version=models.Event.data_version + 1)
+        .returning(models.Event.data_version)
+    ).scalar_one()
+    mark_changed(db, event_id)
+    return version
+
+
+def _add_change(db: Session, event_id: str, version: int, changed_from: datetime | None) -> None:
+    db.add(
+        models.EventChange(
+            event_id=event_id, from_version=version, version=version, changed_from=changed_from
+        )
+    )
+    change = models.EventChange
+    db.execute(
+        delete(change).where(
+            change.event_id == event_id, change.version <= version - CHANGES_RETAINED
+        )
+    )
+
+
+def bump(db: Session, event_id: str, changed_from: datetime | None = None) -> int:
+    version = _next_version(db, event_id)
+    _add_change(db, event_id, version, changed_from)
+    return version
+
+
+class ChangeRun:
+    # Bumps for a series of commits to one event, e.g. the chunks of an import.
+    # Every commit still moves the version, but one change row is extended
+    # while no other change comes in between, instead of adding a row per
+    # commit. Call reset() after a rollback.
+    def __init__(self, event_id: str):
+        self.event_id = event_id
+        self.version: int | None = None
+        self.changed_from: datetime | None = None
+
+    def bump(self, db: Session, changed_from: datetime) -> int:
+        version = _next_version(db, self.event_id)
+        if self.version is not None and self.version == version - 1:
+            self.changed_from = min(self.changed_from, changed_from)
+            change = models.EventChange
+            db.execute(
+                update(change)
+                .where(change.event_id == self.event_id, change.version == self.version)
+                .values(version=version, changed_from=self.changed_from)
+            )
+        else:
+            self.changed_from = changed_from
+            _add_change(db, self.event_id, version, changed_from)
+        self.version = version
+        return version
+
+    def reset(self) -> None:
+        self.version = None
+
+
+def changed_since(db: Session, event: models.Event, since: int) -> tuple[bool, datetime | None]:
+    # Returns (everything_changed, earliest changed occurred_at) for the changes
+    # after version `since`; (False, None) means nothing changed.
+    if since > event.data_version or since < 0:
+        return True, None
+    if since == event.data_version:
+        return False, None
+    change = models.EventChange
+    unknown, earliest, first = db.execute(
+        select(
+            func.count(change.version) - func.count(change.changed_from),
+            func.min(change.changed_from),
+            func.min(change.from_version),
+        ).where(change.event_id == event.id, change.version > since)
+    ).one()
+    # Rows cover consecutive version ranges; pruned ones leave a gap after `since`.
+    if unknown or first is None or first > since + 1:
+        return True, None
+    return False, earliest
+
+
+def etag(event_id: str, version: int, *parts: object) -> str:
+    key = "|".join(str(p) for p in (event_id, version, *parts))
+    return f'W/"{hashlib.sha1(key.encode()).hexdigest()}"'
@@ -9,12 +9,18 @@ export interface EPTSummary {
   id: string;
   label: string;
   total_cents: number;
+  tx_count: number;
+  avg_ticket_cents: number;
+  first_at: string | null;
+  last_at: string | null;
 }
 
 export interface SellingPointSummary {
   id: string;
   name: string;
   total_cents: number;
+  tx_count: number;
+  avg_ticket_cents: number;
   epts: EPTSummary[];
 }
 
@@ -32,16 +38,29 @@ export interface TimelineSeries {
 
 export interface EventTimeline {
   event: { start_at: string; end_at: string };
+  bucket?: string;
   buckets: string[];
   series: TimelineSeries[];
 }
 
 const API_URL = import.meta.env.VITE_API_URL ?? 'http://localhost:8000';
 
+// List endpoints return one page at a time; the next page's cursor comes back
+// in the X-Next-Cursor header until the last page.
+const PAGE_LIMIT = 1000;
+
 export async function fetchEvents(): Promise<Event[]> {
-  const res = await fetch(`${API_URL}/events/`);
-  if (!res.ok) throw new Error('Failed to fetch events');
-  return res.json();
+  const events: Event[] = [];
+  let cursor: string | null = null;
+  do {
+    const params = new URLSearchParams({ limit: String(PAGE_LIMIT) });
+    if (cursor) params.set('cursor', cursor);
+    const res = await fetch(`${API_URL}/events/?${params}`);
+    if (!res.ok) throw new Error('Failed to fetch events');
+    events.push(...(await res.json()));
+    cursor = res.headers.get('X-Next-Cursor');
+  } while (cursor);
+  return events;
 }
 
 export async function createEvent(data: {
@@ -64,8 +83,46 @@ export async function fetchEventSummary(id: string): Promise<EventSummary> {
   return res.json();
 }
 
+interface TimelineBinaryHeader {
+  event: { start_at: string; end_at: string };
+  bucket: string;
+  start: string;
+  step_seconds: number;
+  count: number;
+  dtype: 'int32' | 'int64';
+  series: { selling_point_id: string; lat: number; lng: number; base: number }[];
+}
+
+// Expands the packed `format=binary` timeline (start + step, per-bucket deltas)
+// back into bucket timestamps and cumulative series.
+function decodeTimeline(buffer: ArrayBuffer): EventTimeline {
+  const view = new DataView(buffer);
+  const headerLength = view.getUint32(0, true);
+  const header: TimelineBinaryHeader = JSON.parse(
+    new TextDecoder().decode(new Uint8Array(buffer, 4, headerLength)),
+  );
+  const width = header.dtype === 'int64' ? 8 : 4;
+  let offset = 4 + headerLength;
+
+  const start = Date.parse(`${header.start}Z`);
+  const buckets = Array.from({ length: header.count }, (_, i) =>
+    new Date(start + i * header.step_seconds * 1000).toISOString().slice(0, 19),
+  );
+  const series = header.series.map((s) => {
+    const cumulative = header.count > 0 ? [s.base] : [];
+    for (let i = 1; i < header.count; i++) {
+      const delta =
+        width === 8 ? Number(view.getBigInt64(offset, true)) : view.getInt32(offset, true);
+      cumulative.push(cumulative[i - 1] + delta);
+      offset += width;
+    }
+    return { selling_point_id: s.selling_point_id, lat: s.lat, lng: s.lng, cumulative };
+  });
+  return { event: header.event, bucket: header.bucket, buckets, series };
+}
+
 export async function fetchEventTimeline(id: string): Promise<EventTimeline> {
-  const res = await fetch(`${API_URL}/events/${id}/timeline`);
+  const res = await fetch(`${API_URL}/events/${id}/timeline?format=binary`);
   if (!res.ok) throw new Error('Failed to fetch timeline');
-  return res.json();
+  return decodeTimeline(await res.arrayBuffer());
 }